@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import tempfile
+import asyncio
+import logging
+from typing import Dict, List, Optional, Sequence
+from config import settings
+from cache_manager import cache_manager
+
+logger = logging.getLogger(__name__)
+
+class AccessEntry:
+    """Frecuencia (con decaimiento exponencial) y último acceso de una clave"""
+    __slots__ = ("prefix", "params", "score", "last_access")
+
+    def __init__(self, prefix: str, params: dict, score: float = 0.0, last_access: float = 0.0):
+        self.prefix = prefix
+        self.params = params
+        self.score = score
+        self.last_access = last_access
+
+    def decayed_score(self, now: float) -> float:
+        # La frecuencia pierde la mitad de su peso cada half-life: combina frecuencia y recencia
+        elapsed = max(0.0, now - self.last_access)
+        return self.score * 0.5 ** (elapsed / settings.access_stats_half_life_seconds)
+
+class AccessTracker:
+    """
+    Registra la frecuencia y recencia de acceso por clave de cache, con los
+    parámetros necesarios para volver a cargarla en el warm-up. Se persiste en
+    disco para conservar la popularidad entre reinicios.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, AccessEntry] = {}
+        self.recorded = 0
+
+    def record(self, prefix: str, **params):
+        """Registrar un acceso a la clave `prefix` + `params`"""
+        key = cache_manager._generate_cache_key(prefix, **params)
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = AccessEntry(prefix, params)
+        entry.score = entry.decayed_score(now) + 1.0
+        entry.last_access = now
+        self.recorded += 1
+        if len(self.entries) > settings.access_stats_max_keys:
+            self._prune(now)
+
+    def forget(self, prefix: str, **params):
+        self.entries.pop(cache_manager._generate_cache_key(prefix, **params), None)
+
+    def _prune(self, now: float):
+        """Descartar las claves más frías hasta quedar en el 90% del máximo"""
+        keep = int(settings.access_stats_max_keys * 0.9)
+        ranked = sorted(self.entries.items(), key=lambda item: item[1].decayed_score(now), reverse=True)
+        self.entries = dict(ranked[:keep])
+
+    def top(self, limit: int, prefixes: Optional[Sequence[str]] = None) -> List[AccessEntry]:
+        """Las `limit` claves más calientes, opcionalmente filtradas por prefijo"""
+        now = time.time()
+        candidates = [
+            entry for entry in self.entries.values()
+            if prefixes is None or entry.prefix in prefixes
+        ]
+        candidates.sort(key=lambda entry: entry.decayed_score(now), reverse=True)
+        return candidates[:limit]
+
+    def load(self):
+        """Cargar las estadísticas persistidas (si existen)"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load access stats from {self.path}: {e}")
+            return
+
+        for key, item in data.items():
+            self.entries[key] = AccessEntry(
+                item["prefix"], item["params"], item["score"], item["last_access"]
+            )
+        logger.info(f"Loaded access stats for {len(self.entries)} keys from {self.path}")
+
+    def _write(self, data: dict):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Escritura atómica con un temporal único por proceso: un reinicio a mitad
+        # no deja el archivo corrupto y varios workers no pisan el mismo temporal
+        fd, tmp_path = tempfile.mkstemp(
+            dir=directory or ".", prefix=f"{os.path.basename(self.path)}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    async def save(self):
+        """Persistir las estadísticas en disco"""
+        data = {
+            key: {
+                "prefix": entry.prefix,
+                "params": entry.params,
+                "score": entry.score,
+                "last_access": entry.last_access
+            }
+            for key, entry in self.entries.items()
+        }
+        try:
+            await asyncio.to_thread(self._write, data)
+            logger.debug(f"Saved access stats for {len(data)} keys to {self.path}")
+        except OSError as e:
+            logger.error(f"Could not save access stats to {self.path}: {e}")
+
+    def get_stats(self, limit: int = 10) -> dict:
+        now = time.time()
+        return {
+            "tracked_keys": len(self.entries),
+            "recorded_accesses": self.recorded,
+            "hottest": [
+                {
+                    "prefix": entry.prefix,
+                    "params": entry.params,
+                    "score": round(entry.decayed_score(now), 3)
+                }
+                for entry in self.top(limit)
+            ]
+        }
+
+# Instancia global del registro de accesos
+access_tracker = AccessTracker(settings.access_stats_path)
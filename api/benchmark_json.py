@@ -0,0 +1,134 @@
+"""
+Benchmark de serialización JSON de las rutas que usan la clase de respuesta
+por defecto (FastJSONResponse). Las rutas que devuelven un EncodedBody cacheado
+(/images/by-folder, /presentaciones, /phl-pt-all-tabla) no pasan por ella.
+
+Para rutas que devuelven un modelo, FastAPI primero lo convierte con
+field.serialize(mode="json") y después la clase de respuesta lo renderiza.
+Las rutas calientes (/folders/catalog, /images/by-folder/page,
+/presentaciones/{id}) devuelven en cambio un FastJSONResponse con los dicts
+ya validados que guarda el cache, sin ese paso. Con datos sintéticos del
+tamaño típico de cada ruta se mide:
+  - serialize: field.serialize, lo que FastAPI hace antes de renderizar
+  - stdlib:    render de JSONResponse de Starlette (json.dumps)
+  - fast:      render de FastJSONResponse (orjson, o stdlib si no está)
+  - direct:    FastJSONResponse(dict cacheado): orjson sin field.serialize
+
+Uso:
+    cd api
+    python benchmark_json.py [--repeat 5]
+"""
+import json
+import time
+import base64
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, List
+from pydantic import TypeAdapter
+from json_response import dumps, JSON_ENCODER_NAME
+from main import ImageResponse, ImagePageResponse, FolderCatalogEntry, PresentacionResponse
+
+def build_image_page(count: int = 50, image_bytes: int = 150_000) -> ImagePageResponse:
+    now = datetime(2024, 1, 1)
+    payload = base64.b64encode(b"\x89PNG" + b"\x00" * image_bytes).decode()
+    items = [
+        ImageResponse(
+            id=i,
+            folder_id="folder-id",
+            folder_name="FOLDER",
+            folder_webviewlink="https://drive.google.com/drive/folders/folder-id",
+            folder_modifiedtime=now,
+            image_id=f"image-{i}",
+            image_name=f"image-{i}.png",
+            image_webviewlink=f"https://drive.google.com/file/d/image-{i}/view",
+            image_modifiedtime=now + timedelta(minutes=i),
+            image_base64=payload,
+            image_size_mb=image_bytes / 1024 / 1024,
+            created_at=now + timedelta(minutes=i)
+        )
+        for i in range(count)
+    ]
+    return ImagePageResponse(items=items, next_cursor="cursor")
+
+def build_catalog(count: int = 5_000) -> List[FolderCatalogEntry]:
+    now = datetime(2024, 1, 1)
+    return [
+        FolderCatalogEntry(
+            folder_name=f"FOLDER-{i:05d}",
+            image_count=i % 200,
+            total_size_mb=(i % 200) * 0.15,
+            last_modified=now + timedelta(minutes=i)
+        )
+        for i in range(count)
+    ]
+
+def build_folders(count: int = 5_000) -> List[str]:
+    return [f"FOLDER-{i:05d}" for i in range(count)]
+
+def build_presentacion() -> PresentacionResponse:
+    now = datetime(2024, 1, 1)
+    return PresentacionResponse(
+        id=1,
+        descripcion_producto="Producto 1",
+        peso_caja=1.5,
+        sobre_peso=0.05,
+        esquinero_adicionales=4,
+        created_at=now,
+        updated_at=now
+    )
+
+def stdlib_render(content: Any) -> bytes:
+    """Lo que hace JSONResponse.render de Starlette"""
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+def best_of(func, repeat: int) -> float:
+    """Mejor tiempo en milisegundos de `repeat` ejecuciones"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+def bench_route(name: str, response_type: Any, value: Any, repeat: int):
+    adapter = TypeAdapter(response_type)
+    serialize_ms = best_of(lambda: adapter.dump_python(value, mode="json"), repeat)
+    content = adapter.dump_python(value, mode="json")
+
+    # Lo que guarda el cache: model_dump() en modo python (datetime sin convertir)
+    cached = adapter.dump_python(value)
+
+    stdlib_ms = best_of(lambda: stdlib_render(content), repeat)
+    fast_ms = best_of(lambda: dumps(content), repeat)
+    direct_ms = best_of(lambda: dumps(cached), repeat)
+    size_mb = len(dumps(content)) / 1024 / 1024
+
+    print(
+        f"{name:<28} {size_mb:>8.2f} MB {serialize_ms:>10.3f} ms {stdlib_ms:>10.3f} ms "
+        f"{fast_ms:>10.3f} ms {direct_ms:>10.3f} ms {stdlib_ms / fast_ms:>8.1f}x "
+        f"{(serialize_ms + stdlib_ms) / direct_ms:>8.1f}x"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de serialización JSON por ruta")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Fast encoder: {JSON_ENCODER_NAME}")
+    print(
+        f"{'route':<28} {'payload':>11} {'serialize':>13} {'stdlib':>13} {'fast':>13} "
+        f"{'direct':>13} {'render':>9} {'total':>9}"
+    )
+    bench_route("POST /images/by-folder/page", ImagePageResponse, build_image_page(), args.repeat)
+    bench_route("GET /folders/catalog", List[FolderCatalogEntry], build_catalog(), args.repeat)
+    bench_route("GET /folders", List[str], build_folders(), args.repeat)
+    bench_route("GET /presentaciones/{id}", PresentacionResponse, build_presentacion(), args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,738 @@
+import os
+import sys
+import gzip
 import json
+import mmap
+import time
+import uuid
+import heapq
+import pickle
+import tempfile
 import hashlib
+import zlib
 import asyncio
-from typing import Any, Optional, Union
-from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Set, Union
+from datetime import date, datetime, timedelta
+from decimal import Decimal
 import logging
-from cachetools import TTLCache
+from cachetools import Cache, TLRUCache, LRUCache
+from fastapi import HTTPException
 from config import settings
 
+try:
+    import redis.asyncio as aioredis
+    import msgpack
+    REDIS_INSTALLED = True
+except ImportError:
+    aioredis = None
+    msgpack = None
+    REDIS_INSTALLED = False
+
+try:
+    import lz4.frame
+    LZ4_AVAILABLE = True
+except ImportError:
+    LZ4_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
-class CacheManager:
+def estimate_size(value: Any) -> int:
     """
-    Sistema de cache en memoria optimizado para máximo rendimiento
+    Estimar el tamaño aproximado en bytes de un valor cacheado
+    (recorre listas y dicts; cuenta strings y bytes por su longitud real)
     """
+    if isinstance(value, (bytes, bytearray, str)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+# Codec rápido para valores genéricos: lz4 si está instalado, si no zlib
+COMPRESSION_CODEC = "lz4" if LZ4_AVAILABLE else "zlib"
+
+def _compress_bytes(data: bytes) -> bytes:
+    if COMPRESSION_CODEC == "lz4":
+        return lz4.frame.compress(data)
+    return zlib.compress(data, settings.cache_compression_level)
+
+def _decompress_bytes(codec: str, data: bytes) -> bytes:
+    if codec == "lz4":
+        return lz4.frame.decompress(data)
+    return zlib.decompress(data)
+
+class CompressionStats:
+    """Bytes y tiempo de CPU de la compresión de valores del L1"""
     
     def __init__(self):
-        self.memory_cache = TTLCache(
-            maxsize=settings.memory_cache_size, 
-            ttl=settings.cache_ttl_seconds
+        self.compressed_values = 0
+        self.skipped_values = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.compress_seconds = 0.0
+        self.decompressions = 0
+        self.decompress_seconds = 0.0
+    
+    def record_compress(self, raw_size: int, compressed_size: int, seconds: float):
+        self.compressed_values += 1
+        self.raw_bytes += raw_size
+        self.compressed_bytes += compressed_size
+        self.compress_seconds += seconds
+    
+    def record_decompress(self, seconds: float):
+        self.decompressions += 1
+        self.decompress_seconds += seconds
+    
+    def as_dict(self) -> dict:
+        return {
+            "codec": COMPRESSION_CODEC,
+            "compressed_values": self.compressed_values,
+            "skipped_values": self.skipped_values,
+            "raw_bytes": self.raw_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "ratio": round(self.raw_bytes / self.compressed_bytes, 2) if self.compressed_bytes else None,
+            "compress_cpu_ms": round(self.compress_seconds * 1000, 2),
+            "decompressions": self.decompressions,
+            "decompress_cpu_ms": round(self.decompress_seconds * 1000, 2)
+        }
+
+compression_stats = CompressionStats()
+
+class CompressedValue:
+    """Valor del L1 guardado como pickle comprimido; se descomprime en cada hit"""
+    __slots__ = ("codec", "data", "raw_size")
+    
+    def __init__(self, codec: str, data: bytes, raw_size: int):
+        self.codec = codec
+        self.data = data
+        self.raw_size = raw_size
+    
+    def decompress(self) -> Any:
+        # time.thread_time: CPU del hilo actual, sin contar esperas del event loop
+        start = time.thread_time()
+        value = pickle.loads(_decompress_bytes(self.codec, self.data))
+        compression_stats.record_decompress(time.thread_time() - start)
+        return value
+    
+    def __sizeof__(self) -> int:
+        return object.__sizeof__(self) + len(self.data)
+
+def _gzip_body(content: bytes) -> tuple:
+    """Comprimir un cuerpo (corre en un hilo); devuelve (gzip, segundos de CPU)"""
+    level = settings.response_gzip_level
+    if len(content) >= settings.response_gzip_large_bytes:
+        level = settings.response_gzip_large_level
+    start = time.thread_time()
+    data = gzip.compress(content, compresslevel=level)
+    return data, time.thread_time() - start
+
+class EncodedBody:
+    """
+    Cuerpo de respuesta ya serializado a JSON y, si es grande y se cachea,
+    precomprimido con gzip. Un cache hit lo devuelve tal cual, sin volver a serializar.
+    """
+    __slots__ = ("_content", "gzip_content", "media_type", "gzip_seconds")
+    
+    def __init__(self, content: bytes, media_type: str = "application/json"):
+        self._content = content
+        self.media_type = media_type
+        # El gzip se genera en precompress(), solo para cuerpos que se cachean
+        self.gzip_content = None
+        # CPU gastada en el gzip; se reporta como compresión si el cuerpo se guarda compacto
+        self.gzip_seconds = 0.0
+    
+    async def precompress(self):
+        """Generar el gzip en un hilo para no bloquear el event loop"""
+        if (
+            self.gzip_content is None
+            and self._content is not None
+            and settings.response_gzip_enabled
+            and len(self._content) >= settings.response_gzip_min_bytes
+        ):
+            self.gzip_content, self.gzip_seconds = await asyncio.to_thread(_gzip_body, self._content)
+    
+    @property
+    def content(self) -> bytes:
+        """JSON sin comprimir; en un cuerpo compacto se descomprime del gzip"""
+        if self._content is not None:
+            return self._content
+        start = time.thread_time()
+        content = gzip.decompress(self.gzip_content)
+        compression_stats.record_decompress(time.thread_time() - start)
+        return content
+    
+    @classmethod
+    def from_parts(
+        cls,
+        content: Optional[bytes],
+        gzip_content: Optional[bytes],
+        media_type: str
+    ) -> "EncodedBody":
+        """Reconstruir un cuerpo ya codificado, sin volver a comprimir"""
+        body = cls.__new__(cls)
+        body._content = content
+        body.gzip_content = gzip_content
+        body.media_type = media_type
+        body.gzip_seconds = 0.0
+        return body
+    
+    @property
+    def is_compact(self) -> bool:
+        return self._content is None
+    
+    def compact(self) -> "EncodedBody":
+        """
+        Copia que conserva solo el gzip: los clientes con Accept-Encoding gzip
+        lo reciben tal cual y el resto paga la descompresión
+        """
+        if self.gzip_content is None or self._content is None:
+            return self
+        body = EncodedBody.from_parts(None, self.gzip_content, self.media_type)
+        body.gzip_seconds = self.gzip_seconds
+        return body
+    
+    def __sizeof__(self) -> int:
+        content_size = len(self._content) if self._content is not None else 0
+        gzip_size = len(self.gzip_content) if self.gzip_content is not None else 0
+        return object.__sizeof__(self) + content_size + gzip_size
+
+class NegativeResult:
+    """
+    Resultado "no encontrado" (404) cacheado con TTL corto para no consultar
+    la DB en cada request a un folder o ID inexistente
+    """
+    __slots__ = ("detail",)
+    
+    def __init__(self, detail: Any):
+        self.detail = detail
+    
+    def __getstate__(self):
+        return self.detail
+    
+    def __setstate__(self, state):
+        self.detail = state
+    
+    def to_exception(self) -> HTTPException:
+        return HTTPException(status_code=404, detail=self.detail)
+
+class CacheEntry:
+    """
+    Valor cacheado junto con su tamaño estimado en bytes, su TTL propio, el
+    instante hasta el que se considera fresco (soft TTL) y el loader que
+    permite refrescarlo
+    """
+    __slots__ = ("value", "size", "ttl", "expires_at", "fresh_until", "loader")
+    
+    def __init__(
+        self,
+        value: Any,
+        ttl: float,
+        soft_ttl: float,
+        loader: Optional[Callable[[], Awaitable[Any]]] = None
+    ):
+        self.value = value
+        self.size = estimate_size(value)
+        self.ttl = ttl
+        now = time.monotonic()
+        self.expires_at = now + ttl
+        self.fresh_until = now + soft_ttl
+        self.loader = loader
+    
+    def is_stale(self) -> bool:
+        return time.monotonic() >= self.fresh_until
+
+# Tabla para dividir a la mitad todos los contadores de una fila con bytes.translate
+_HALVE_TABLE = bytes(i >> 1 for i in range(256))
+
+class FrequencySketch:
+    """
+    Count-min sketch compacto (TinyLFU): 4 filas de contadores de un byte
+    saturados en 15. Cada `sample_size` incrementos todos los contadores se
+    dividen a la mitad para que la frecuencia refleje el uso reciente.
+    """
+    DEPTH = 4
+    MAX_COUNT = 15
+    
+    def __init__(self, width: int):
+        self.width = 1 << max(4, (width - 1).bit_length())
+        self.mask = self.width - 1
+        self.rows = [bytearray(self.width) for _ in range(self.DEPTH)]
+        self.sample_size = 10 * self.width
+        self.additions = 0
+        self.resets = 0
+    
+    def _indexes(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) & self.mask for i in range(self.DEPTH)]
+    
+    def increment(self, key: str):
+        indexes = self._indexes(key)
+        counts = [row[index] for row, index in zip(self.rows, indexes)]
+        current = min(counts)
+        if current < self.MAX_COUNT:
+            # Conservative update: solo suben los contadores que están en el mínimo
+            for row, index, count in zip(self.rows, indexes, counts):
+                if count == current:
+                    row[index] = current + 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._reset()
+    
+    def estimate(self, key: str) -> int:
+        return min(row[index] for row, index in zip(self.rows, self._indexes(key)))
+    
+    def _reset(self):
+        self.rows = [bytearray(row.translate(_HALVE_TABLE)) for row in self.rows]
+        self.additions //= 2
+        self.resets += 1
+
+class ByteBudgetTLRUCache(TLRUCache):
+    """
+    TLRUCache que limita el total de bytes estimados (no el número de items)
+    y lleva la cuenta de expulsiones y expiraciones. Cada entrada expira según
+    su propio TTL (heap ordenado por vencimiento). Con un `sketch`, una
+    entrada nueva solo entra si es más frecuente que las que desplazaría.
+    """
+    
+    def __init__(self, maxsize: int, sketch: Optional[FrequencySketch] = None):
+        super().__init__(
+            maxsize=maxsize,
+            ttu=lambda key, entry, now: now + entry.ttl,
+            getsizeof=lambda entry: entry.size
         )
+        self.sketch = sketch
+        # Llamado con cada clave que sale del cache sin un delete explícito
+        self.on_remove: Optional[Callable[[str], None]] = None
+        self.evictions = 0
+        self.expirations = 0
+        self.admitted = 0
+        self.rejected = 0
+    
+    def admit(self, key: str, size: int) -> bool:
+        """
+        Filtro de admisión TinyLFU: si hace falta espacio, comparar la frecuencia
+        de la clave nueva con la de las víctimas y, si gana, expulsarlas.
+        Lanza ValueError (como Cache.__setitem__) si el valor excede la partición.
+        """
+        if self.sketch is None or key in self or self.currsize + size <= self.maxsize:
+            return True
+        if size > self.maxsize:
+            # No cabría ni vaciando la partición: rechazarlo antes de expulsar nada
+            raise ValueError("value too large")
+        
+        self.expire()
+        needed = self.currsize + size - self.maxsize
+        if needed <= 0:
+            return True
+        
+        candidate_frequency = self.sketch.estimate(key)
+        victims = []
+        freed = 0
+        # Las víctimas son las que expulsaría popitem: de la menos a la más recientemente usada
+        for victim in self.lru_keys():
+            if self.sketch.estimate(victim) >= candidate_frequency:
+                self.rejected += 1
+                return False
+            victims.append(victim)
+            freed += Cache.__getitem__(self, victim).size
+            if freed >= needed:
+                break
+        
+        for victim in victims:
+            del self[victim]
+            self.evictions += 1
+            if self.on_remove is not None:
+                self.on_remove(victim)
+        self.admitted += 1
+        return True
+    
+    def lru_keys(self) -> Iterator[str]:
+        """
+        Claves vigentes de la menos a la más recientemente usada (llamar tras
+        expire()). Iterar el cache recorre el heap de vencimientos, que no
+        está ordenado ni sigue el orden LRU.
+        """
+        return iter(self._TLRUCache__items)
+    
+    def popitem(self):
+        # Solo se llama cuando hace falta espacio: es una expulsión por presupuesto
+        item = super().popitem()
+        self.evictions += 1
+        if self.on_remove is not None:
+            self.on_remove(item[0])
+        return item
+    
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.expirations += len(expired)
+        if self.on_remove is not None:
+            for key, _ in expired:
+                self.on_remove(key)
+        return expired
+    
+    def largest_entries(self, count: int = 5) -> list:
+        """Claves con mayor tamaño estimado"""
+        # Cache.__getitem__: leer sin mover las claves al final del orden LRU
+        sizes = ((key, Cache.__getitem__(self, key).size) for key in list(self))
+        largest = heapq.nlargest(count, sizes, key=lambda item: item[1])
+        return [{"key": key, "bytes": size} for key, size in largest]
+
+class PartitionedCache:
+    """
+    L1 dividido en particiones por namespace de clave, cada una con su propio
+    presupuesto de bytes, TTL por defecto y política de expulsión ("tinylfu"
+    o "lru"), para que una ráfaga de imágenes no expulse las entradas chicas
+    y calientes de otras tablas. Expone la misma interfaz que una partición.
+    """
+    DEFAULT_PARTITION = "default"
+    POLICIES = ("tinylfu", "lru")
+    
+    def __init__(self, total_bytes: int, partitions: Dict[str, Dict[str, Any]], sketch_width: int):
+        self.partitions: Dict[str, ByteBudgetTLRUCache] = {}
+        self.policies: Dict[str, str] = {}
+        self.ttls: Dict[str, Optional[float]] = {}
+        # Hits/misses por partición
+        self.access: Dict[str, List[int]] = {}
+        self._by_namespace: Dict[str, str] = {}
+        self._sketch_width = sketch_width
+        
+        shares = sum(float(config["share"]) for config in partitions.values())
+        if shares > 1:
+            raise ValueError(f"Cache partition shares add up to {shares:.2f}, more than the whole memory budget")
+        for name, config in partitions.items():
+            self._add_partition(
+                name,
+                int(total_bytes * float(config["share"])),
+                config.get("policy", "tinylfu"),
+                config.get("ttl")
+            )
+            for namespace in config.get("namespaces", ()):
+                self._by_namespace[namespace] = name
+        if self.DEFAULT_PARTITION not in self.partitions:
+            # Namespaces sin partición propia comparten lo que queda del presupuesto
+            self._add_partition(self.DEFAULT_PARTITION, int(total_bytes * (1 - shares)), "tinylfu", None)
+    
+    def _add_partition(self, name: str, maxsize: int, policy: str, ttl: Optional[float]):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown eviction policy {policy!r} for cache partition {name}")
+        if not settings.cache_admission_enabled:
+            policy = "lru"
+        sketch = FrequencySketch(self._sketch_width) if policy == "tinylfu" else None
+        self.partitions[name] = ByteBudgetTLRUCache(maxsize=maxsize, sketch=sketch)
+        self.policies[name] = policy
+        self.ttls[name] = ttl
+        self.access[name] = [0, 0]
+    
+    def partition_name(self, key: str) -> str:
+        return self._by_namespace.get(key.split(":", 1)[0], self.DEFAULT_PARTITION)
+    
+    def partition(self, key: str) -> ByteBudgetTLRUCache:
+        return self.partitions[self.partition_name(key)]
+    
+    def ttl(self, key: str) -> Optional[float]:
+        """TTL por defecto de la partición de la clave (None: usar el global)"""
+        return self.ttls[self.partition_name(key)]
+    
+    def record_access(self, key: str, hit: bool):
+        """Alimentar el sketch y los contadores de la partición de la clave"""
+        name = self.partition_name(key)
+        sketch = self.partitions[name].sketch
+        if sketch is not None:
+            sketch.increment(key)
+        self.access[name][0 if hit else 1] += 1
+    
+    def admit(self, key: str, size: int) -> bool:
+        return self.partition(key).admit(key, size)
+    
+    def peek(self, key: str) -> "CacheEntry":
+        """Leer sin alterar el orden LRU ni expirar"""
+        return Cache.__getitem__(self.partition(key), key)
+    
+    def get(self, key: str, default=None):
+        return self.partition(key).get(key, default)
+    
+    def __getitem__(self, key: str):
+        return self.partition(key)[key]
+    
+    def __setitem__(self, key: str, entry: "CacheEntry"):
+        self.partition(key)[key] = entry
+    
+    def __delitem__(self, key: str):
+        del self.partition(key)[key]
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.partition(key)
+    
+    def __iter__(self):
+        for partition in self.partitions.values():
+            yield from list(partition)
+    
+    def __len__(self) -> int:
+        return sum(len(partition) for partition in self.partitions.values())
+    
+    def keys(self) -> list:
+        return list(self)
+    
+    def items(self) -> list:
+        """Pares (clave, entrada) leídos con peek, sin alterar el orden LRU"""
+        return [(key, self.peek(key)) for key in self]
+    
+    def values(self) -> list:
+        return [entry for _, entry in self.items()]
+    
+    def clear(self):
+        for partition in self.partitions.values():
+            partition.clear()
+    
+    @property
+    def on_remove(self) -> Optional[Callable[[str], None]]:
+        return self.partitions[self.DEFAULT_PARTITION].on_remove
+    
+    @on_remove.setter
+    def on_remove(self, callback: Optional[Callable[[str], None]]):
+        for partition in self.partitions.values():
+            partition.on_remove = callback
+    
+    def _total(self, attribute: str) -> int:
+        return sum(getattr(partition, attribute) for partition in self.partitions.values())
+    
+    @property
+    def currsize(self) -> int:
+        return self._total("currsize")
+    
+    @property
+    def maxsize(self) -> int:
+        return self._total("maxsize")
+    
+    @property
+    def evictions(self) -> int:
+        return self._total("evictions")
+    
+    @property
+    def expirations(self) -> int:
+        return self._total("expirations")
+    
+    @property
+    def admitted(self) -> int:
+        return self._total("admitted")
+    
+    @property
+    def rejected(self) -> int:
+        return self._total("rejected")
+    
+    @property
+    def admission_enabled(self) -> bool:
+        return any(partition.sketch is not None for partition in self.partitions.values())
+    
+    @property
+    def sketch_resets(self) -> int:
+        return sum(
+            partition.sketch.resets
+            for partition in self.partitions.values()
+            if partition.sketch is not None
+        )
+    
+    def largest_entries(self, count: int = 5) -> list:
+        """Claves con mayor tamaño estimado entre todas las particiones"""
+        candidates = [
+            item
+            for partition in self.partitions.values()
+            for item in partition.largest_entries(count)
+        ]
+        return heapq.nlargest(count, candidates, key=lambda item: item["bytes"])
+    
+    def get_stats(self) -> dict:
+        stats = {}
+        for name, partition in self.partitions.items():
+            hits, misses = self.access[name]
+            stats[name] = {
+                "namespaces": sorted(ns for ns, owner in self._by_namespace.items() if owner == name),
+                "policy": self.policies[name],
+                "ttl_seconds": self.ttls[name] if self.ttls[name] is not None else settings.cache_ttl_seconds,
+                "items": len(partition),
+                "bytes": partition.currsize,
+                "maxbytes": partition.maxsize,
+                "evictions": partition.evictions,
+                "expirations": partition.expirations,
+                "admission_admitted": partition.admitted,
+                "admission_rejected": partition.rejected,
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None
+            }
+        return stats
+
+# Tipos de extensión del formato del L2. Solo datos: a diferencia de pickle,
+# leer una entrada de un Redis compartido nunca ejecuta código.
+_EXT_DATETIME = 1
+_EXT_DATE = 2
+_EXT_DECIMAL = 3
+_EXT_ENCODED_BODY = 4
+_EXT_NEGATIVE_RESULT = 5
+
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, datetime):
+        return msgpack.ExtType(_EXT_DATETIME, obj.isoformat().encode())
+    if isinstance(obj, date):
+        return msgpack.ExtType(_EXT_DATE, obj.isoformat().encode())
+    if isinstance(obj, Decimal):
+        return msgpack.ExtType(_EXT_DECIMAL, str(obj).encode())
+    if isinstance(obj, EncodedBody):
+        parts = [obj._content, obj.gzip_content, obj.media_type]
+        return msgpack.ExtType(_EXT_ENCODED_BODY, msgpack.packb(parts))
+    if isinstance(obj, NegativeResult):
+        return msgpack.ExtType(_EXT_NEGATIVE_RESULT, msgpack.packb(obj.detail, default=_msgpack_default))
+    raise TypeError(f"Object of type {type(obj).__name__} cannot be stored in the L2 cache")
+
+def _msgpack_ext_hook(code: int, data: bytes) -> Any:
+    if code == _EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    if code == _EXT_DATE:
+        return date.fromisoformat(data.decode())
+    if code == _EXT_DECIMAL:
+        return Decimal(data.decode())
+    if code == _EXT_ENCODED_BODY:
+        content, gzip_content, media_type = msgpack.unpackb(data)
+        return EncodedBody.from_parts(content, gzip_content, media_type)
+    if code == _EXT_NEGATIVE_RESULT:
+        return NegativeResult(msgpack.unpackb(data, ext_hook=_msgpack_ext_hook, strict_map_key=False))
+    raise ValueError(f"Unknown L2 cache extension type {code}")
+
+# Cabecera del archivo de snapshot del L1
+SNAPSHOT_MAGIC = b"IMGAPI-CACHE-SNAPSHOT-3\n"
+
+class CacheManager:
+    """
+    Cache de dos niveles: L1 en memoria por proceso (particionado) y L2 compartido
+    en Redis. Las invalidaciones se propagan a todos los workers por pub/sub.
+    """
+    
+    def __init__(self, redis_client=None):
+        # L1 particionado por namespace (ver Settings.cache_partitions)
+        self.memory_cache = PartitionedCache(
+            settings.memory_cache_bytes,
+            settings.cache_partitions,
+            settings.cache_sketch_width
+        )
+        # Cache de bytes de imágenes decodificadas, limitado por tamaño total en bytes
+        self.image_bytes_cache = LRUCache(
+            maxsize=settings.image_bytes_cache_size,
+            getsizeof=len
+        )
+        # Variantes redimensionadas (miniaturas), también limitadas por bytes
+        self.image_variant_cache = LRUCache(
+            maxsize=settings.thumbnail_cache_size,
+            getsizeof=len
+        )
+        # Cargas en curso por clave (single-flight)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Tags de cada carga en curso y claves invalidadas mientras cargaban:
+        # su resultado se descarta para no volver a cachear el valor viejo
+        self._inflight_tags: Dict[str, tuple] = {}
+        self._invalidated_loads: Set[str] = set()
+        self.discarded_loads = 0
+        self.coalesced_loads = 0
+        self.stale_hits = 0
+        self.background_refreshes = 0
+        self.refresh_failures = 0
+        # L2 en Redis (se puede inyectar un cliente, p. ej. un fake en pruebas)
+        self.redis = redis_client
+        # Cliente del listener de invalidaciones (por defecto el mismo)
+        self._pubsub_redis = redis_client
         self.redis_available = False
+        self.instance_id = uuid.uuid4().hex
+        self._pubsub = None
+        self._invalidation_task: Optional[asyncio.Task] = None
+        self.invalidation_reconnects = 0
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.l2_errors = 0
+        # Circuit breaker del L2: tras un error no se consulta Redis hasta _l2_retry_at
+        self._l2_backoff = 0.0
+        self._l2_retry_at = 0.0
+        self.l2_circuit_trips = 0
+        # Hits/misses totales y por prefijo de clave ("images_by_folder", "phl_pt_all_tabla_all", ...)
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.negative_sets = 0
+        self.prefix_stats: Dict[str, List[int]] = {}
+        # Índice inverso de tags ("folder:X", "presentacion:7", ...) -> claves del L1
+        self._tag_index: Dict[str, Set[str]] = {}
+        self._key_tags: Dict[str, tuple] = {}
+        self.memory_cache.on_remove = self._untag_local
+        self.tag_invalidations = 0
+        self.snapshot_loaded = 0
         
     async def initialize(self):
-        """Inicializar cache en memoria"""
+        """Inicializar cache en memoria y conectar el L2 en Redis"""
         if not settings.cache_enabled:
             logger.info("Cache disabled in settings")
             return
             
-        logger.info(f"Memory cache initialized with {settings.memory_cache_size} max items and {settings.cache_ttl_seconds}s TTL")
+        logger.info(
+            f"Memory cache initialized with {settings.memory_cache_bytes} max bytes in partitions "
+            f"{list(self.memory_cache.partitions)} and {settings.cache_ttl_seconds}s default TTL"
+        )
+        
+        if not settings.redis_enabled:
+            return
+        if self.redis is None:
+            if not REDIS_INSTALLED:
+                logger.warning("redis/msgpack packages not installed, running memory-only cache")
+                return
+            # socket_timeout: un Redis que acepta la conexión pero no responde
+            # lanza TimeoutError y abre el circuito en vez de colgar cada request
+            self.redis = aioredis.from_url(
+                settings.redis_url,
+                socket_connect_timeout=settings.redis_connect_timeout,
+                socket_timeout=settings.redis_socket_timeout
+            )
+            # El pub/sub usa un cliente sin socket_timeout: redis-py 5 lo aplica a
+            # la lectura bloqueante de listen() y cortaría la suscripción en cada
+            # período sin mensajes
+            self._pubsub_redis = aioredis.from_url(
+                settings.redis_url,
+                socket_connect_timeout=settings.redis_connect_timeout
+            )
+        
+        try:
+            await self.redis.ping()
+            await self._subscribe_invalidations()
+            self._invalidation_task = asyncio.create_task(self._listen_invalidations())
+            self.redis_available = True
+            logger.info(f"Redis L2 cache connected at {settings.redis_url}")
+        except Exception as e:
+            logger.warning(f"Redis not available, running memory-only cache: {e}")
+            self.redis_available = False
     
     async def close(self):
-        """Limpiar cache en memoria"""
+        """Limpiar cache en memoria y cerrar la conexión a Redis"""
+        if self._invalidation_task:
+            self._invalidation_task.cancel()
+            self._invalidation_task = None
+        await self._close_pubsub()
+        clients = [self.redis]
+        if self._pubsub_redis is not self.redis:
+            clients.append(self._pubsub_redis)
+        for client in clients:
+            if client is None:
+                continue
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.debug(f"Error closing Redis client: {e}")
+        self.redis_available = False
         self.memory_cache.clear()
+        self.image_bytes_cache.clear()
+        self.image_variant_cache.clear()
+        self._tag_index.clear()
+        self._key_tags.clear()
         logger.info("Memory cache cleared")
     
     def _generate_cache_key(self, prefix: str, **kwargs) -> str:
@@ -45,16 +746,232 @@ class CacheManager:
         
         return f"{prefix}:{hash_str}"
     
+    def _l2_ready(self) -> bool:
+        """L2 conectado y sin el circuito abierto por un error reciente"""
+        return self.redis_available and time.monotonic() >= self._l2_retry_at
+    
+    def _l2_failed(self, operation: str, error: Exception):
+        """
+        Contar el error y abrir el circuito con backoff exponencial: mientras
+        Redis no responda se trabaja solo con memoria, sin esperar el timeout
+        de conexión en cada request
+        """
+        self.l2_errors += 1
+        if time.monotonic() < self._l2_retry_at:
+            # Otra operación concurrente ya abrió el circuito
+            return
+        self._l2_backoff = min(
+            self._l2_backoff * 2 if self._l2_backoff else settings.redis_retry_seconds,
+            settings.redis_retry_max_seconds
+        )
+        self._l2_retry_at = time.monotonic() + self._l2_backoff
+        self.l2_circuit_trips += 1
+        logger.error(f"Redis {operation} error, memory-only cache for {self._l2_backoff:.0f}s: {error}")
+    
+    def _l2_succeeded(self):
+        if self._l2_backoff:
+            logger.info("Redis L2 cache reachable again")
+            self._l2_backoff = 0.0
+    
+    def _redis_key(self, key: str) -> str:
+        return f"{settings.redis_key_prefix}{key}"
+    
+    def _redis_tag_key(self, tag: str) -> str:
+        return f"{settings.redis_key_prefix}tag:{tag}"
+    
+    def _tag_local(self, key: str, tags: Iterable[str]):
+        """Registrar la clave bajo sus tags en el índice inverso"""
+        tags = tuple(tags)
+        if self._key_tags.get(key) == tags:
+            return
+        self._untag_local(key)
+        if not tags:
+            return
+        self._key_tags[key] = tags
+        for tag in tags:
+            self._tag_index.setdefault(tag, set()).add(key)
+    
+    def _untag_local(self, key: str):
+        """Quitar la clave del índice inverso"""
+        for tag in self._key_tags.pop(key, ()):
+            keys = self._tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_index[tag]
+    
+    @staticmethod
+    def _serialize(value: Any, tags: Iterable[str] = ()) -> bytes:
+        """
+        Serialización binaria compacta (msgpack) para Redis; soporta datetime/Decimal.
+        Los tags van delante del valor para que un read-through los registre en el L1.
+        """
+        return msgpack.packb(list(tags)) + msgpack.packb(value, default=_msgpack_default)
+    
+    @staticmethod
+    def _deserialize(data: bytes) -> Optional[tuple]:
+        """Leer una entrada del L2 como (valor, tags); None si no está en un formato conocido"""
+        try:
+            unpacker = msgpack.Unpacker(
+                ext_hook=_msgpack_ext_hook,
+                strict_map_key=False,
+                max_buffer_size=len(data)
+            )
+            unpacker.feed(data)
+            objects = list(unpacker)
+            if len(objects) != 2:
+                # p. ej. entradas de una versión anterior, sin tags: no se podrían invalidar
+                raise ValueError(f"expected tags and value, got {len(objects)} objects")
+            tags, value = objects
+            return value, tuple(tags)
+        except Exception as e:
+            # Se tratan como miss
+            logger.warning(f"Ignoring unreadable L2 cache entry: {e}")
+            return None
+    
+    def _set_local(
+        self,
+        key: str,
+        value: Any,
+        loader: Optional[Callable[[], Awaitable[Any]]] = None,
+        tags: Iterable[str] = (),
+        ttl: Optional[float] = None
+    ) -> Optional[CacheEntry]:
+        """
+        Guardar en L1 si el filtro de admisión lo acepta (devuelve None si no).
+        Puede lanzar ValueError si el valor excede el presupuesto total.
+        """
+        ttl = self._resolve_ttl(key, ttl)
+        entry = CacheEntry(self._compress_value(key, value), ttl, self._soft_ttl(ttl), loader)
+        if not self.memory_cache.admit(key, entry.size):
+            logger.debug(f"Cache admission rejected: {key}")
+            return None
+        self.memory_cache[key] = entry
+        self._tag_local(key, tags)
+        return entry
+    
+    def _compress_value(self, key: str, value: Any) -> Any:
+        """
+        Comprimir valores grandes antes de guardarlos en L1. Los EncodedBody
+        ya traen su gzip y se guardan compactos; el resto se comprime como pickle.
+        Lo que apenas se reduce se guarda sin comprimir.
+        """
+        enabled = settings.cache_namespace_compression.get(
+            self._namespace(key), settings.cache_compression_enabled
+        )
+        if not enabled or isinstance(value, CompressedValue):
+            return value
+        
+        if isinstance(value, EncodedBody):
+            if value.is_compact or value.gzip_content is None:
+                return value
+            raw_size = len(value.content)
+            if raw_size < settings.cache_compression_min_bytes:
+                return value
+            # El gzip se hizo en precompress() (0 si vino ya comprimido del L2)
+            if len(value.gzip_content) >= raw_size * settings.cache_compression_max_ratio:
+                # Conservar el JSON: cada hit sin gzip tendría que descomprimirlo entero
+                compression_stats.skipped_values += 1
+                compression_stats.compress_seconds += value.gzip_seconds
+                return value
+            compression_stats.record_compress(raw_size, len(value.gzip_content), value.gzip_seconds)
+            return value.compact()
+        
+        raw_size = estimate_size(value)
+        if raw_size < settings.cache_compression_min_bytes:
+            return value
+        start = time.thread_time()
+        data = _compress_bytes(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        elapsed = time.thread_time() - start
+        if len(data) >= raw_size * settings.cache_compression_max_ratio:
+            # Casi incompresible (p. ej. bytes ya comprimidos): no vale la pena descomprimir en cada hit
+            compression_stats.skipped_values += 1
+            compression_stats.compress_seconds += elapsed
+            return value
+        compression_stats.record_compress(raw_size, len(data), elapsed)
+        return CompressedValue(COMPRESSION_CODEC, data, raw_size)
+    
+    @staticmethod
+    def _unwrap(value: Any) -> Any:
+        if isinstance(value, CompressedValue):
+            return value.decompress()
+        return value
+    
+    def _record_access(self, key: str, hit: bool, track: bool = True):
+        """
+        Alimentar el sketch de frecuencias y los contadores por prefijo (salvo
+        con track=False, p. ej. el warm-up, que no es tráfico real)
+        """
+        if not track:
+            return
+        self.memory_cache.record_access(key, hit)
+        counters = self.prefix_stats.setdefault(self._namespace(key), [0, 0])
+        counters[0 if hit else 1] += 1
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+    
     async def get(self, key: str) -> Optional[Any]:
-        """Obtener valor del cache"""
+        """Obtener valor del cache (las entradas negativas se ven como miss)"""
+        value = await self._get(key)
+        if isinstance(value, NegativeResult):
+            return None
+        return value
+    
+    async def _get(
+        self,
+        key: str,
+        track: bool = True,
+        loader: Optional[Callable[[], Awaitable[Any]]] = None
+    ) -> Optional[Any]:
+        """
+        Obtener el valor cacheado tal cual, incluidas las entradas negativas.
+        Una entrada traída del L2 se guarda en L1 con `loader` para poder refrescarla.
+        """
         if not settings.cache_enabled:
             return None
             
         try:
-            if key in self.memory_cache:
-                logger.debug(f"Cache hit: {key}")
-                return self.memory_cache[key]
-                
+            entry = self.memory_cache.get(key)
+            if entry is not None:
+                self._record_access(key, True, track)
+                # Entre soft TTL y hard TTL: devolver el valor y refrescar en segundo plano
+                if entry.is_stale():
+                    self.stale_hits += 1
+                    logger.debug(f"Cache stale hit: {key}")
+                    self._schedule_refresh(key, entry)
+                else:
+                    logger.debug(f"Cache hit: {key}")
+                return self._unwrap(entry.value)
+            
+            # L1 miss: consultar el L2 compartido
+            if self._l2_ready():
+                try:
+                    async with self.redis.pipeline(transaction=False) as pipe:
+                        pipe.get(self._redis_key(key))
+                        pipe.pttl(self._redis_key(key))
+                        data, remaining_ms = await pipe.execute()
+                    self._l2_succeeded()
+                except Exception as e:
+                    # Un fallo del L2 cuenta como error y como miss (igual que en get_many)
+                    self._l2_failed("get", e)
+                else:
+                    found = self._deserialize(data) if data is not None else None
+                    if found is not None:
+                        value, tags = found
+                        self.l2_hits += 1
+                        self._record_access(key, True, track)
+                        try:
+                            # En L1 vive solo lo que le queda en L2, con los tags de la entrada
+                            self._set_local(key, value, loader, tags, self._remaining_ttl(remaining_ms))
+                        except ValueError:
+                            pass
+                        logger.debug(f"Cache L2 hit: {key}")
+                        return value
+                    self.l2_misses += 1
+            
+            self._record_access(key, False, track)
             logger.debug(f"Cache miss: {key}")
             return None
             
@@ -62,56 +979,414 @@ class CacheManager:
             logger.error(f"Cache get error: {e}")
             return None
     
-    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
-        """Guardar valor en cache"""
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        loader: Optional[Callable[[], Awaitable[Any]]] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> bool:
+        """
+        Guardar valor en cache (con `loader` la entrada se refresca al quedar
+        stale; con `tags` se puede invalidar con `invalidate_tag`)
+        """
         if not settings.cache_enabled:
             return False
+        
+        # Un refresco sin tags conserva los tags con los que se registró la clave
+        tags = tuple(tags) if tags is not None else self._key_tags.get(key, ())
+        ttl = self._resolve_ttl(key, ttl)
             
         try:
-            # Guardar en memoria
-            self.memory_cache[key] = value
-            logger.debug(f"Cache set: {key}")
+            if isinstance(value, EncodedBody):
+                await value.precompress()
+            # Guardar en Redis (L2) y en memoria (L1)
+            if self._l2_ready():
+                await self._redis_set(key, value, tags, ttl)
+            entry = self._set_local(key, value, loader, tags, ttl)
+            if entry is not None:
+                logger.debug(f"Cache set: {key} ({entry.size} bytes)")
             return True
             
+        except ValueError:
+            # El valor por sí solo supera el presupuesto total de bytes
+            logger.warning(f"Cache value too large for memory budget: {key}")
+            return False
         except Exception as e:
             logger.error(f"Cache set error: {e}")
             return False
     
+    async def set_many(
+        self,
+        values: Dict[str, Any],
+        loaders: Optional[Dict[str, Callable[[], Awaitable[Any]]]] = None,
+        tags: Optional[Dict[str, Iterable[str]]] = None
+    ) -> int:
+        """
+        Guardar varias claves escribiendo el L2 con un solo pipeline. Los
+        NegativeResult se guardan con el TTL de las entradas negativas.
+        Devuelve cuántas quedaron en L1.
+        """
+        if not settings.cache_enabled or not values:
+            return 0
+        loaders = loaders or {}
+        tags = tags or {}
+        
+        entries = []
+        for key, value in values.items():
+            ttl = None
+            if isinstance(value, NegativeResult):
+                if settings.cache_negative_ttl_seconds <= 0:
+                    continue
+                self.negative_sets += 1
+                ttl = settings.cache_negative_ttl_seconds
+            key_tags = tuple(tags[key]) if key in tags else self._key_tags.get(key, ())
+            entries.append((key, value, key_tags, self._resolve_ttl(key, ttl)))
+        
+        await asyncio.gather(*(
+            value.precompress() for _, value, _, _ in entries if isinstance(value, EncodedBody)
+        ))
+        if self._l2_ready():
+            await self._redis_set_many(entries)
+        
+        stored = 0
+        for key, value, key_tags, ttl in entries:
+            try:
+                if self._set_local(key, value, loaders.get(key), key_tags, ttl) is not None:
+                    stored += 1
+            except ValueError:
+                logger.warning(f"Cache value too large for memory budget: {key}")
+        return stored
+    
+    async def _redis_set(self, key: str, value: Any, tags: Iterable[str], ttl: float):
+        """Guardar en L2 (y en los sets de sus tags); un fallo de Redis no impide cachear en L1"""
+        await self._redis_set_many([(key, value, tags, ttl)])
+    
+    async def _redis_set_many(self, entries: List[tuple]):
+        """Guardar entradas (clave, valor, tags, ttl) en L2 con un solo round trip"""
+        serialized = []
+        for key, value, tags, ttl in entries:
+            try:
+                serialized.append((key, self._serialize(value, tags), tags, ttl))
+            except Exception as e:
+                # Un tipo no soportado por el L2 no es un fallo de Redis: no abre el circuito
+                self.l2_errors += 1
+                logger.error(f"Cannot serialize {key} for the L2 cache: {e}")
+        if not serialized:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, data, tags, ttl in serialized:
+                    pipe.set(self._redis_key(key), data, px=max(1, int(ttl * 1000)))
+                    for tag in tags:
+                        tag_key = self._redis_tag_key(tag)
+                        pipe.sadd(tag_key, key)
+                        # El set del tag debe sobrevivir a la entrada más longeva que indexa
+                        pipe.expire(tag_key, int(max(ttl, self._max_ttl())) + 1)
+                await pipe.execute()
+            self._l2_succeeded()
+        except Exception as e:
+            self._l2_failed("set", e)
+    
+    async def get_many(
+        self,
+        keys: List[str],
+        loaders: Optional[Dict[str, Callable[[], Awaitable[Any]]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Obtener varias claves: L1 primero y las restantes del L2 con un solo
+        MGET pipelined. Devuelve solo las claves encontradas (las entradas
+        negativas como NegativeResult). `loaders` por clave permite refrescar
+        en segundo plano las entradas traídas del L2.
+        """
+        loaders = loaders or {}
+        if not settings.cache_enabled:
+            return {}
+        
+        found = {}
+        missing = []
+        for key in keys:
+            entry = self.memory_cache.get(key)
+            if entry is not None:
+                self._record_access(key, True)
+                if entry.is_stale():
+                    self.stale_hits += 1
+                    self._schedule_refresh(key, entry)
+                found[key] = self._unwrap(entry.value)
+            else:
+                missing.append(key)
+        
+        if missing and self._l2_ready():
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.mget([self._redis_key(key) for key in missing])
+                    for key in missing:
+                        pipe.pttl(self._redis_key(key))
+                    values, *remaining = await pipe.execute()
+                self._l2_succeeded()
+                for key, data, remaining_ms in zip(missing, values, remaining):
+                    entry = self._deserialize(data) if data is not None else None
+                    if entry is None:
+                        self.l2_misses += 1
+                        continue
+                    value, tags = entry
+                    self.l2_hits += 1
+                    self._record_access(key, True)
+                    found[key] = value
+                    try:
+                        self._set_local(key, value, loaders.get(key), tags, self._remaining_ttl(remaining_ms))
+                    except ValueError:
+                        pass
+            except Exception as e:
+                self._l2_failed("multi-get", e)
+        
+        for key in missing:
+            if key not in found:
+                self._record_access(key, False)
+        
+        return found
+    
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None,
+        tags: Optional[Iterable[str]] = None,
+        track: bool = True
+    ) -> Any:
+        """
+        Obtener valor del cache o cargarlo con `loader`. Solo una corrutina por
+        clave ejecuta la carga; las demás esperan su resultado. Un 404 del
+        loader se cachea como entrada negativa y se vuelve a lanzar. Con
+        track=False el acceso no cuenta en hits/misses ni en el sketch.
+        """
+        cached_value = await self._get(key, track, loader)
+        if isinstance(cached_value, NegativeResult):
+            if track:
+                self.negative_hits += 1
+            raise cached_value.to_exception()
+        if cached_value is not None:
+            return cached_value
+        
+        if not settings.cache_enabled:
+            return await loader()
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._start_load(key, loader, ttl, tags)
+        else:
+            self.coalesced_loads += 1
+            logger.debug(f"Cache load coalesced: {key}")
+        
+        # shield: si un cliente se desconecta no se cancela la carga compartida
+        return await asyncio.shield(task)
+    
+    def _start_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float],
+        tags: Optional[Iterable[str]]
+    ) -> asyncio.Task:
+        """Lanzar la carga única de una clave y registrarla como en curso"""
+        tags = tuple(tags) if tags is not None else None
+        task = asyncio.ensure_future(self._load_and_set(key, loader, ttl, tags))
+        self._inflight[key] = task
+        # Un refresco sin tags se guarda con los que ya tenía la clave
+        self._inflight_tags[key] = tags if tags is not None else self._key_tags.get(key, ())
+        
+        def finish(_):
+            self._inflight.pop(key, None)
+            self._inflight_tags.pop(key, None)
+            self._invalidated_loads.discard(key)
+        
+        task.add_done_callback(finish)
+        return task
+    
+    async def _load_and_set(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float],
+        tags: Optional[Iterable[str]]
+    ) -> Any:
+        """
+        Ejecutar el loader y guardar su resultado, salvo que la clave se haya
+        invalidado durante la carga: el loader pudo leer la fila vieja
+        """
+        try:
+            value = await loader()
+        except HTTPException as e:
+            if e.status_code == 404 and not self._load_invalidated(key):
+                await self.set_negative(key, e.detail, tags)
+            raise
+        if value is not None and not self._load_invalidated(key):
+            await self.set(key, value, ttl, loader=loader, tags=tags)
+        return value
+    
+    def _load_invalidated(self, key: str) -> bool:
+        if key not in self._invalidated_loads:
+            return False
+        self.discarded_loads += 1
+        logger.debug(f"Cache load invalidated while in flight, not storing: {key}")
+        return True
+    
+    def _invalidate_inflight(self, keys: Iterable[str]):
+        """Marcar como invalidadas las cargas en curso de estas claves"""
+        self._invalidated_loads.update(key for key in keys if key in self._inflight)
+    
+    def _invalidate_inflight_tag(self, tag: str):
+        self._invalidate_inflight(key for key, tags in self._inflight_tags.items() if tag in tags)
+    
+    async def set_negative(self, key: str, detail: Any, tags: Optional[Iterable[str]] = None) -> bool:
+        """
+        Guardar un "no encontrado" con TTL corto, bajo los mismos tags que la
+        entrada positiva para que las mismas escrituras lo invaliden
+        """
+        if settings.cache_negative_ttl_seconds <= 0:
+            return False
+        self.negative_sets += 1
+        return await self.set(key, NegativeResult(detail), ttl=settings.cache_negative_ttl_seconds, tags=tags)
+    
+    @staticmethod
+    def _namespace(key: str) -> str:
+        return key.split(":", 1)[0]
+    
+    def _resolve_ttl(self, key: str, ttl: Optional[float]) -> float:
+        """TTL explícito, si no el del namespace, si no el de su partición, si no el global"""
+        if ttl is not None:
+            return ttl
+        namespace_ttl = settings.cache_namespace_ttls.get(self._namespace(key))
+        if namespace_ttl is not None:
+            return namespace_ttl
+        partition_ttl = self.memory_cache.ttl(key)
+        return partition_ttl if partition_ttl is not None else settings.cache_ttl_seconds
+    
+    def stale_window(self, namespace: str) -> float:
+        """Segundos entre el soft y el hard TTL por defecto de un namespace: un hit en ese tramo lo refresca"""
+        ttl = self._resolve_ttl(namespace, None)
+        return ttl - self._soft_ttl(ttl)
+    
+    def _remaining_ttl(self, remaining_ms: Optional[int]) -> Optional[float]:
+        """TTL restante de una clave de Redis (PTTL negativo = sin expiración o inexistente)"""
+        if remaining_ms is None or remaining_ms <= 0:
+            return None
+        return remaining_ms / 1000
+    
+    def _max_ttl(self) -> float:
+        partition_ttls = [ttl for ttl in self.memory_cache.ttls.values() if ttl is not None]
+        return max([settings.cache_ttl_seconds, *settings.cache_namespace_ttls.values(), *partition_ttls])
+    
+    @staticmethod
+    def _soft_ttl(ttl: float) -> float:
+        """Segundos durante los que una entrada se sirve como fresca (misma proporción que el default)"""
+        ratio = min(1.0, settings.cache_soft_ttl_seconds / settings.cache_ttl_seconds)
+        return ttl * ratio
+    
+    def _schedule_refresh(self, key: str, entry: CacheEntry):
+        """Lanzar un único refresco en segundo plano para una entrada stale"""
+        if entry.loader is None or key in self._inflight:
+            return
+        
+        # El refresco conserva el TTL con el que se guardó la entrada
+        task = self._start_load(key, entry.loader, entry.ttl, None)
+        self.background_refreshes += 1
+        
+        def on_done(finished: asyncio.Task):
+            if not finished.cancelled() and finished.exception() is not None:
+                # El valor stale sigue sirviéndose hasta el hard TTL
+                self.refresh_failures += 1
+                logger.warning(f"Background refresh failed for {key}: {finished.exception()}")
+        
+        task.add_done_callback(on_done)
+    
     async def delete(self, key: str) -> bool:
-        """Eliminar valor del cache"""
+        """Eliminar valor del cache (en todos los workers)"""
         if not settings.cache_enabled:
             return False
             
         try:
-            # Eliminar de memoria
-            if key in self.memory_cache:
-                del self.memory_cache[key]
-                logger.debug(f"Cache deleted: {key}")
-                return True
+            deleted = self._delete_local(key)
             
-            return False
+            if self._l2_ready():
+                try:
+                    deleted = bool(await self.redis.delete(self._redis_key(key))) or deleted
+                    await self._publish_invalidation({"op": "delete", "key": key})
+                except Exception as e:
+                    self._l2_failed("delete", e)
+            
+            if deleted:
+                logger.debug(f"Cache deleted: {key}")
+            return deleted
             
         except Exception as e:
             logger.error(f"Cache delete error: {e}")
             return False
     
+    async def invalidate_tag(self, tag: str) -> int:
+        """
+        Eliminar todas las claves registradas bajo `tag` (en todos los workers).
+        El costo es proporcional a las claves afectadas, no al tamaño del cache.
+        """
+        if not settings.cache_enabled:
+            return 0
+        
+        try:
+            keys = set(self._tag_index.get(tag, ()))
+            self._invalidate_inflight_tag(tag)
+            
+            if self._l2_ready():
+                try:
+                    # Leer y borrar el set del tag de forma atómica
+                    async with self.redis.pipeline(transaction=True) as pipe:
+                        pipe.smembers(self._redis_tag_key(tag))
+                        pipe.delete(self._redis_tag_key(tag))
+                        members, _ = await pipe.execute()
+                    keys.update(
+                        member.decode() if isinstance(member, bytes) else member
+                        for member in members
+                    )
+                    if keys:
+                        await self.redis.delete(*(self._redis_key(key) for key in keys))
+                    await self._publish_invalidation({"op": "tag", "tag": tag, "keys": sorted(keys)})
+                except Exception as e:
+                    self._l2_failed("invalidate tag", e)
+            
+            deleted_count = self._invalidate_local_keys(keys)
+            self.tag_invalidations += 1
+            logger.info(f"Invalidated {len(keys)} cache entries tagged {tag} ({deleted_count} in memory)")
+            return len(keys)
+            
+        except Exception as e:
+            logger.error(f"Cache invalidate tag error: {e}")
+            return 0
+    
+    def local_tags(self, prefix: str = "") -> List[str]:
+        """Tags con entradas en el L1 (opcionalmente filtrados por prefijo)"""
+        return [tag for tag in self._tag_index if tag.startswith(prefix)]
+    
+    def _invalidate_local_keys(self, keys: Iterable[str]) -> int:
+        """Eliminar del L1 un conjunto de claves"""
+        return sum(1 for key in keys if self._delete_local(key))
+    
     async def clear_pattern(self, pattern: str) -> int:
-        """Eliminar todas las claves que coincidan con un patrón"""
+        """
+        Eliminar todas las claves que coincidan con un patrón (en todos los workers).
+        Recorre todo el cache: para invalidar por tabla, folder o id usar `invalidate_tag`.
+        """
         if not settings.cache_enabled:
             return 0
             
-        deleted_count = 0
-        
         try:
-            # Limpiar memoria
-            if pattern == "*":
-                deleted_count = len(self.memory_cache)
-                self.memory_cache.clear()
-            else:
-                keys_to_delete = [k for k in self.memory_cache.keys() if pattern.replace('*', '') in k]
-                for key in keys_to_delete:
-                    del self.memory_cache[key]
-                    deleted_count += 1
+            deleted_count = self._clear_local_pattern(pattern)
+            
+            if self._l2_ready():
+                try:
+                    deleted_count = max(deleted_count, await self._redis_clear_pattern(pattern))
+                    await self._publish_invalidation({"op": "pattern", "pattern": pattern})
+                except Exception as e:
+                    self._l2_failed("clear pattern", e)
             
             logger.info(f"Cleared {deleted_count} cache entries matching pattern: {pattern}")
             return deleted_count
@@ -120,15 +1395,325 @@ class CacheManager:
             logger.error(f"Cache clear pattern error: {e}")
             return 0
     
+    def _delete_local(self, key: str) -> bool:
+        """Eliminar una clave del L1 (y descartar su carga en curso, si la hay)"""
+        self._invalidate_inflight((key,))
+        self._untag_local(key)
+        if key in self.memory_cache:
+            del self.memory_cache[key]
+            return True
+        return False
+    
+    def _clear_local_pattern(self, pattern: str) -> int:
+        """Eliminar del L1 las claves que coincidan con un patrón"""
+        deleted_count = 0
+        if pattern == "*":
+            deleted_count = (
+                len(self.memory_cache)
+                + len(self.image_bytes_cache)
+                + len(self.image_variant_cache)
+            )
+            self.memory_cache.clear()
+            self.image_bytes_cache.clear()
+            self.image_variant_cache.clear()
+            self._tag_index.clear()
+            self._key_tags.clear()
+            self._invalidate_inflight(list(self._inflight))
+        else:
+            self._invalidate_inflight([k for k in self._inflight if pattern.replace('*', '') in k])
+            keys_to_delete = [k for k in self.memory_cache.keys() if pattern.replace('*', '') in k]
+            for key in keys_to_delete:
+                self._delete_local(key)
+                deleted_count += 1
+        return deleted_count
+    
+    async def _redis_clear_pattern(self, pattern: str) -> int:
+        """Eliminar del L2 las claves que coincidan con un patrón"""
+        match = f"{settings.redis_key_prefix}*{pattern.replace('*', '')}*"
+        deleted_count = 0
+        batch = []
+        async for redis_key in self.redis.scan_iter(match=match, count=500):
+            batch.append(redis_key)
+            if len(batch) >= 500:
+                deleted_count += await self.redis.delete(*batch)
+                batch = []
+        if batch:
+            deleted_count += await self.redis.delete(*batch)
+        return deleted_count
+    
+    async def _publish_invalidation(self, message: dict):
+        """Avisar al resto de workers para que invaliden su L1"""
+        message["origin"] = self.instance_id
+        await self.redis.publish(settings.redis_invalidation_channel, json.dumps(message))
+    
+    async def _subscribe_invalidations(self):
+        self._pubsub = self._pubsub_redis.pubsub()
+        await self._pubsub.subscribe(settings.redis_invalidation_channel)
+    
+    async def _close_pubsub(self):
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception as e:
+                logger.debug(f"Error closing Redis pubsub: {e}")
+            self._pubsub = None
+    
+    async def _listen_invalidations(self):
+        """
+        Aplicar en el L1 las invalidaciones publicadas por otros workers. Si la
+        conexión se cae, reintentar con backoff y, al volver a suscribirse,
+        vaciar el L1: las invalidaciones perdidas mientras tanto no se recuperan.
+        """
+        delay = 1
+        while True:
+            try:
+                if self._pubsub is None:
+                    await self._subscribe_invalidations()
+                    self._clear_local_after_reconnect()
+                    self.invalidation_reconnects += 1
+                    delay = 1
+                    logger.info("Redis invalidation listener reconnected, memory cache cleared")
+                async for message in self._pubsub.listen():
+                    self._apply_invalidation(message)
+                # listen() termina si se pierde la suscripción: tratarlo como desconexión
+                raise ConnectionError("Redis invalidation subscription ended")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Redis invalidation listener disconnected, retrying in {delay}s: {e}")
+                await self._close_pubsub()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+    
+    def _apply_invalidation(self, message: dict):
+        if message.get("type") != "message":
+            return
+        try:
+            data = json.loads(message["data"])
+        except (TypeError, ValueError):
+            return
+        if data.get("origin") == self.instance_id:
+            return
+        if data.get("op") == "delete":
+            self._delete_local(data["key"])
+        elif data.get("op") == "tag":
+            self._invalidate_inflight_tag(data["tag"])
+            keys = set(self._tag_index.get(data["tag"], ()))
+            keys.update(data.get("keys", ()))
+            self._invalidate_local_keys(keys)
+        elif data.get("op") == "pattern":
+            self._clear_local_pattern(data["pattern"])
+    
+    def _clear_local_after_reconnect(self):
+        """Vaciar el L1 (no las imágenes, que se validan por versión): pudo quedar desactualizado"""
+        self.memory_cache.clear()
+        self._tag_index.clear()
+        self._key_tags.clear()
+        self._invalidate_inflight(list(self._inflight))
+    
+    def _snapshot_records(self) -> list:
+        """
+        Entradas vigentes del L1 con sus tiempos pasados a reloj de pared
+        (time.monotonic no sobrevive a un reinicio)
+        """
+        now_monotonic = time.monotonic()
+        now_wall = time.time()
+        records = []
+        for key in list(self.memory_cache):
+            # peek: leer sin alterar el orden LRU
+            entry = self.memory_cache.peek(key)
+            try:
+                loader = pickle.dumps(entry.loader, protocol=pickle.HIGHEST_PROTOCOL) if entry.loader else None
+            except Exception:
+                # Loaders no serializables (lambdas, closures): la entrada se restaura sin refresco
+                loader = None
+            records.append((
+                key,
+                entry.value,
+                entry.ttl,
+                now_wall + (entry.expires_at - now_monotonic),
+                now_wall + (entry.fresh_until - now_monotonic),
+                self._key_tags.get(key, ()),
+                loader
+            ))
+        return records
+    
+    @staticmethod
+    def _write_snapshot(path: str, metadata: dict, records: list):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Escritura atómica con un temporal propio de este proceso: varios workers
+        # que se apagan a la vez no escriben sobre el mismo archivo
+        fd, tmp_path = tempfile.mkstemp(dir=directory or ".", prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(SNAPSHOT_MAGIC)
+                pickler = pickle.Pickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+                # Sin memo compartido entre registros (ni con la cabecera): cada uno
+                # se lee con su propio Unpickler
+                for record in [{"created_at": time.time(), "count": len(records), "metadata": metadata}, *records]:
+                    pickler.dump(record)
+                    pickler.clear_memo()
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    
+    async def save_snapshot(self, path: str, metadata: Optional[dict] = None) -> int:
+        """Escribir en disco las entradas vigentes del L1 para un arranque en caliente"""
+        if not settings.cache_enabled:
+            return 0
+        records = self._snapshot_records()
+        try:
+            await asyncio.to_thread(self._write_snapshot, path, metadata or {}, records)
+            logger.info(f"Saved cache snapshot with {len(records)} entries to {path}")
+            return len(records)
+        except Exception as e:
+            logger.error(f"Could not save cache snapshot to {path}: {e}")
+            return 0
+    
+    def load_snapshot(self, path: str) -> Optional[dict]:
+        """
+        Cargar un snapshot (leído con mmap, registro a registro) en el L1,
+        descartando las entradas vencidas. Devuelve la metadata guardada.
+        """
+        if not settings.cache_enabled:
+            return None
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if mapped.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                    logger.warning(f"Ignoring cache snapshot with unknown format: {path}")
+                    return None
+                header = pickle.Unpickler(mapped).load()
+                now_monotonic = time.monotonic()
+                now_wall = time.time()
+                loaded = expired = 0
+                for _ in range(header["count"]):
+                    # Un Unpickler por registro: el writer limpia su memo entre registros
+                    key, value, ttl, expires_wall, fresh_wall, tags, loader = pickle.Unpickler(mapped).load()
+                    remaining = expires_wall - now_wall
+                    if remaining <= 0:
+                        expired += 1
+                        continue
+                    try:
+                        loader = pickle.loads(loader) if loader else None
+                    except Exception:
+                        loader = None
+                    try:
+                        entry = self._set_local(key, value, loader, tags, remaining)
+                    except ValueError:
+                        # Ya no cabe en su partición (p. ej. presupuesto reducido): seguir con el resto
+                        continue
+                    if entry is not None:
+                        # Conservar el TTL original (para refrescos) y el soft TTL restante
+                        entry.ttl = ttl
+                        entry.fresh_until = now_monotonic + (fresh_wall - now_wall)
+                        loaded += 1
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Could not load cache snapshot from {path}: {e}")
+            return None
+        
+        self.snapshot_loaded = loaded
+        age = now_wall - header["created_at"]
+        logger.info(f"Loaded {loaded} cache entries from snapshot {path} ({expired} expired, {age:.0f}s old)")
+        return header["metadata"]
+    
+    def get_image_bytes(self, image_id: str, modified_time: datetime) -> Optional[bytes]:
+        """Obtener bytes decodificados de una imagen si la versión coincide"""
+        if not settings.cache_enabled:
+            return None
+        return self.image_bytes_cache.get((image_id, modified_time))
+    
+    def set_image_bytes(self, image_id: str, modified_time: datetime, data: bytes) -> bool:
+        """Guardar bytes decodificados de una imagen"""
+        if not settings.cache_enabled:
+            return False
+        try:
+            self.image_bytes_cache[(image_id, modified_time)] = data
+            return True
+        except ValueError:
+            # La imagen es más grande que todo el presupuesto del cache
+            logger.debug(f"Image too large to cache: {image_id} ({len(data)} bytes)")
+            return False
+    
+    def get_image_variant(self, variant_key: tuple) -> Optional[bytes]:
+        """Obtener variante redimensionada (image_id, modifiedtime, tamaño, formato)"""
+        if not settings.cache_enabled:
+            return None
+        return self.image_variant_cache.get(variant_key)
+    
+    def set_image_variant(self, variant_key: tuple, data: bytes) -> bool:
+        """Guardar variante redimensionada"""
+        if not settings.cache_enabled:
+            return False
+        try:
+            self.image_variant_cache[variant_key] = data
+            return True
+        except ValueError:
+            logger.debug(f"Image variant too large to cache: {variant_key}")
+            return False
+    
     async def get_stats(self) -> dict:
         """Obtener estadísticas del cache"""
         stats = {
             "enabled": settings.cache_enabled,
             "redis_available": self.redis_available,
             "memory_cache_size": len(self.memory_cache),
-            "memory_cache_maxsize": self.memory_cache.maxsize,
+            "memory_cache_bytes": self.memory_cache.currsize,
+            "memory_cache_maxbytes": self.memory_cache.maxsize,
+            "memory_cache_evictions": self.memory_cache.evictions,
+            "memory_cache_expirations": self.memory_cache.expirations,
+            "memory_cache_largest_entries": self.memory_cache.largest_entries(),
+            "memory_cache_partitions": self.memory_cache.get_stats(),
+            "admission_enabled": self.memory_cache.admission_enabled,
+            "admission_admitted": self.memory_cache.admitted,
+            "admission_rejected": self.memory_cache.rejected,
+            "sketch_resets": self.memory_cache.sketch_resets,
+            "tags": len(self._tag_index),
+            "tag_invalidations": self.tag_invalidations,
+            "snapshot_loaded_entries": self.snapshot_loaded,
+            "compression_enabled": settings.cache_compression_enabled,
+            "compression_min_bytes": settings.cache_compression_min_bytes,
+            "compression": compression_stats.as_dict(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+            "negative_entries_set": self.negative_sets,
+            "negative_ttl_seconds": settings.cache_negative_ttl_seconds,
+            "hit_ratio_by_prefix": {
+                prefix: {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None
+                }
+                for prefix, (hits, misses) in sorted(self.prefix_stats.items())
+            },
+            "inflight_loads": len(self._inflight),
+            "coalesced_loads": self.coalesced_loads,
+            "discarded_loads": self.discarded_loads,
+            "stale_hits": self.stale_hits,
+            "background_refreshes": self.background_refreshes,
+            "refresh_failures": self.refresh_failures,
+            "image_bytes_cache_items": len(self.image_bytes_cache),
+            "image_bytes_cache_bytes": self.image_bytes_cache.currsize,
+            "image_bytes_cache_maxbytes": self.image_bytes_cache.maxsize,
+            "image_variant_cache_items": len(self.image_variant_cache),
+            "image_variant_cache_bytes": self.image_variant_cache.currsize,
+            "image_variant_cache_maxbytes": self.image_variant_cache.maxsize,
+            "l2_hits": self.l2_hits,
+            "l2_misses": self.l2_misses,
+            "l2_errors": self.l2_errors,
+            "l2_circuit_open": self.redis_available and not self._l2_ready(),
+            "l2_circuit_trips": self.l2_circuit_trips,
+            "invalidation_listener_connected": self._pubsub is not None,
+            "invalidation_reconnects": self.invalidation_reconnects,
             "ttl_seconds": settings.cache_ttl_seconds,
-            "cache_type": "memory_only"
+            "soft_ttl_seconds": self._soft_ttl(settings.cache_ttl_seconds),
+            "namespace_ttls": settings.cache_namespace_ttls,
+            "cache_type": "memory+redis" if self._l2_ready() else "memory_only"
         }
         
         return stats
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Any, Dict, Optional
 
 class Settings(BaseSettings):
     # Database settings
@@ -21,12 +21,108 @@ class Settings(BaseSettings):
     # Database connection pool settings
     db_min_connections: int = 10
     db_max_connections: int = 20
+    db_stream_chunk_size: int = 50  # Rows fetched per server-side cursor round trip
     
     # Cache settings
     redis_url: str = "redis://redis:6379"  # Docker service name
-    cache_ttl_seconds: int = 300  # 5 minutes default
+    redis_enabled: bool = True  # Shared L2 cache; falls back to memory-only if unreachable
+    redis_key_prefix: str = "images_api:"
+    redis_connect_timeout: float = 2.0
+    redis_socket_timeout: float = 1.0  # A Redis command slower than this counts as an L2 failure
+    # After a runtime Redis error the L2 is skipped for this long (doubling up to the max)
+    redis_retry_seconds: float = 1.0
+    redis_retry_max_seconds: float = 60.0
+    redis_invalidation_channel: str = "images_api:invalidate"
+    cache_ttl_seconds: int = 300  # 5 minutes default (hard TTL)
+    cache_soft_ttl_seconds: int = 240  # Soft/hard ratio: entries past it are served stale and refreshed
+    # TTL override per key namespace (prefix before ":"); by default the partition TTL applies
+    cache_namespace_ttls: Dict[str, int] = {}
     cache_enabled: bool = True
-    memory_cache_size: int = 1000  # Max items in memory cache
+    cache_negative_ttl_seconds: int = 30  # TTL of cached 404s (missing folders/IDs); 0 disables
+    cache_snapshot_enabled: bool = True  # Save the memory cache on shutdown and reload it on startup
+    cache_snapshot_path: str = "data/cache_snapshot.bin"
+    db_notify_enabled: bool = True  # LISTEN for cache invalidation NOTIFY events
+    db_notify_channel: str = "cache_invalidation"  # Must match sql/cache_invalidation_triggers.sql
+    db_notify_debounce_seconds: float = 0.5  # Batch window for invalidation notifications
+    db_notify_healthcheck_seconds: float = 30.0  # Probe the listener connection with SELECT 1; 0 disables
+    db_notify_healthcheck_timeout: float = 5.0  # A probe slower than this counts as a dead connection
+    memory_cache_bytes: int = 256 * 1024 * 1024  # Approximate byte budget of the memory cache
+    # Memory cache partitions by key namespace: share of memory_cache_bytes, default TTL
+    # and eviction policy ("tinylfu" or "lru"). Unlisted namespaces share the remainder.
+    cache_partitions: Dict[str, Dict[str, Any]] = {
+        "images": {
+            "namespaces": ["images_by_folder", "images_manifest_by_folder", "images_page_by_folder"],
+            "share": 0.70,
+            "ttl": 300,
+            "policy": "tinylfu",
+        },
+        "phl_pt_all_tabla": {
+            "namespaces": ["phl_pt_all_tabla_all", "phl_pt_all_tabla_date_range"],
+            "share": 0.20,
+            "ttl": 120,
+            "policy": "tinylfu",
+        },
+        "presentaciones": {
+            "namespaces": ["presentaciones_all", "presentacion_by_id"],
+            "share": 0.04,
+            "ttl": 1800,
+            "policy": "lru",
+        },
+        "folders": {
+            "namespaces": ["folders_list", "folders_catalog"],
+            "share": 0.04,
+            "ttl": 600,
+            "policy": "lru",
+        },
+    }
+    cache_admission_enabled: bool = True  # TinyLFU admission; disable to compare with plain LRU/TTL
+    cache_sketch_width: int = 16384  # Counters per row of the frequency sketch
+    cache_compression_enabled: bool = True  # Compress large values held in the memory cache
+    cache_compression_min_bytes: int = 16 * 1024  # Smaller values are kept raw
+    cache_compression_level: int = 1  # zlib level (lz4 is used instead when installed)
+    # Values that don't shrink below this fraction of their size stay raw
+    cache_compression_max_ratio: float = 0.9
+    # Per-namespace override of cache_compression_enabled. Hot, small lookups stay raw,
+    # and image bodies (base64, ~1.3x) keep their JSON so hits without gzip don't gunzip
+    cache_namespace_compression: Dict[str, bool] = {
+        "folders_list": False,
+        "folders_catalog": False,
+        "images_by_folder": False,
+        "images_manifest_by_folder": False,
+        "images_page_by_folder": False,
+    }
+    image_bytes_cache_size: int = 256 * 1024 * 1024  # Max bytes of decoded images in memory
+    image_http_max_age: int = 3600  # Cache-Control max-age for raw image responses
+    thumbnail_cache_size: int = 64 * 1024 * 1024  # Max bytes of resized variants in memory
+    
+    # Pre-serialized response settings
+    response_gzip_enabled: bool = True  # Precompress cached JSON bodies
+    response_gzip_min_bytes: int = 1024
+    response_gzip_level: int = 5
+    # Large bodies (mostly base64 images, ~1.3x) use a cheaper level
+    response_gzip_large_bytes: int = 1024 * 1024
+    response_gzip_large_level: int = 1
+    
+    # Thumbnail settings
+    thumbnail_workers: int = 2  # Processes used for Pillow resizing
+    thumbnail_quality: int = 80
+    
+    # Warm-up settings
+    cache_warmup_enabled: bool = True  # Warm the hottest keys on startup and on a schedule
+    cache_warmup_top_n: int = 20
+    # Upper bound; the schedule runs at the shortest soft-to-hard TTL window among the
+    # warmed namespaces (24s for phl_pt_all_tabla: 120s TTL, 0.8 soft ratio) so every
+    # hot key gets a stale hit, and with it a background refresh, before it expires
+    cache_warmup_interval_seconds: int = 240
+    cache_warmup_pool_fraction: float = 0.5  # Share of pool connections warm-up may use at once
+    access_stats_path: str = "data/access_stats.json"  # Persisted access frequency/recency
+    access_stats_half_life_seconds: int = 3600  # Frequency decay; favours recently used keys
+    access_stats_max_keys: int = 10000
+    
+    # Batch settings
+    batch_max_folders: int = 500  # Max folders per /images/batch-folders request with manifest=true
+    # Full-image batches hold every image_base64 in memory at once: keep them small
+    batch_max_full_folders: int = 20
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,161 @@
+import json
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+import asyncpg
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class DbChangeListener:
+    """
+    Conexión dedicada (fuera del pool) que escucha los NOTIFY emitidos por los
+    triggers de sql/cache_invalidation_triggers.sql y entrega los cambios en lotes
+    """
+
+    def __init__(
+        self,
+        on_changes: Callable[[List[dict]], Awaitable[None]],
+        on_reconnect: Optional[Callable[[], Awaitable[None]]] = None
+    ):
+        self.on_changes = on_changes
+        self.on_reconnect = on_reconnect
+        self.connection: Optional[asyncpg.Connection] = None
+        self._pending: dict = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._healthcheck_task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.notifications_received = 0
+        self.batches_applied = 0
+        self.healthcheck_failures = 0
+
+    async def start(self):
+        """Abrir la conexión de escucha"""
+        if not settings.db_notify_enabled:
+            logger.info("Database change notifications disabled in settings")
+            return
+        try:
+            await self._connect()
+        except Exception as e:
+            # Sin listener la API sigue funcionando con invalidación por TTL
+            logger.error(f"Failed to start database change listener: {e}")
+            self._schedule_reconnect()
+        if settings.db_notify_healthcheck_seconds > 0:
+            self._healthcheck_task = asyncio.create_task(self._healthcheck())
+
+    async def close(self):
+        """Cerrar la conexión de escucha"""
+        self._closing = True
+        for task in (self._flush_task, self._reconnect_task, self._healthcheck_task):
+            if task:
+                task.cancel()
+        if self.connection and not self.connection.is_closed():
+            await self.connection.close()
+        self.connection = None
+        logger.info("Database change listener closed")
+
+    @property
+    def listening(self) -> bool:
+        return self.connection is not None and not self.connection.is_closed()
+
+    async def _connect(self):
+        self.connection = await asyncpg.connect(
+            host=settings.db_host,
+            port=settings.db_port,
+            database=settings.db_name,
+            user=settings.db_user,
+            password=settings.db_password
+        )
+        self.connection.add_termination_listener(self._on_termination)
+        await self.connection.add_listener(settings.db_notify_channel, self._on_notification)
+        logger.info(f"Listening for database changes on channel: {settings.db_notify_channel}")
+
+    def _on_notification(self, connection, pid, channel, payload):
+        """Callback de asyncpg: acumular el cambio y programar el flush"""
+        try:
+            change = json.loads(payload)
+        except ValueError:
+            logger.warning(f"Ignoring malformed notification payload: {payload}")
+            return
+        self.notifications_received += 1
+        # Deduplicar cambios idénticos dentro de la ventana de debounce
+        self._pending[json.dumps(change, sort_keys=True)] = change
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        # Mientras on_changes corre no se programa otro flush: los cambios que
+        # lleguen en ese lapso se aplican en la siguiente vuelta, no quedan varados
+        while self._pending:
+            await asyncio.sleep(settings.db_notify_debounce_seconds)
+            changes = list(self._pending.values())
+            self._pending.clear()
+            try:
+                await self.on_changes(changes)
+                self.batches_applied += 1
+            except Exception as e:
+                logger.error(f"Error applying database change notifications: {e}")
+
+    async def _healthcheck(self):
+        """
+        Sondear la conexión periódicamente: si el TCP muere sin evento de cierre
+        (p. ej. un NAT que descarta la sesión) asyncpg no se entera y el
+        listener dejaría de recibir notificaciones sin avisar
+        """
+        while not self._closing:
+            await asyncio.sleep(settings.db_notify_healthcheck_seconds)
+            connection = self.connection
+            if connection is None or connection.is_closed():
+                continue
+            try:
+                await asyncio.wait_for(
+                    connection.fetchval("SELECT 1"),
+                    timeout=settings.db_notify_healthcheck_timeout
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self._closing or connection is not self.connection:
+                    continue
+                self.healthcheck_failures += 1
+                logger.warning(f"Database change listener health check failed: {e}")
+                self.connection = None
+                connection.terminate()
+                self._schedule_reconnect()
+
+    def _on_termination(self, connection):
+        if self._closing or connection is not self.connection:
+            # Cierre propio o conexión ya descartada por el health check
+            return
+        logger.warning("Database change listener connection lost")
+        self.connection = None
+        self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        if self._closing or (self._reconnect_task and not self._reconnect_task.done()):
+            return
+        self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = 1
+        while not self._closing:
+            await asyncio.sleep(delay)
+            try:
+                await self._connect()
+                # Pudimos perder notificaciones mientras estábamos desconectados
+                if self.on_reconnect:
+                    await self.on_reconnect()
+                return
+            except Exception as e:
+                logger.warning(f"Database change listener reconnect failed: {e}")
+                delay = min(delay * 2, 60)
+
+    def get_stats(self) -> dict:
+        return {
+            "listening": self.listening,
+            "channel": settings.db_notify_channel,
+            "notifications_received": self.notifications_received,
+            "batches_applied": self.batches_applied,
+            "healthcheck_failures": self.healthcheck_failures
+        }
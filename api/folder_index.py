@@ -0,0 +1,73 @@
+import bisect
+import logging
+from typing import Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+class FolderPrefixIndex:
+    """
+    Índice en memoria de folder_name ordenado para autocompletar por prefijo.
+    La búsqueda es una bisección sobre la lista ordenada, sin tocar la DB.
+    """
+
+    def __init__(self):
+        # (clave normalizada, folder_name) ordenado por clave
+        self._entries: List[Tuple[str, str]] = []
+        self.ready = False
+        self.lookups = 0
+        self.rebuilds = 0
+
+    @staticmethod
+    def _normalize(value: str) -> str:
+        return value.casefold()
+
+    def rebuild(self, folder_names: Iterable[str]):
+        """Reemplazar el índice completo con la lista de folders"""
+        self._entries = sorted(
+            (self._normalize(name), name) for name in set(folder_names) if name
+        )
+        self.ready = True
+        self.rebuilds += 1
+        logger.info(f"Folder prefix index rebuilt with {len(self._entries)} folders")
+
+    def invalidate(self):
+        """Marcar el índice para reconstruirlo en la próxima búsqueda"""
+        self.ready = False
+
+    def add(self, folder_name: str):
+        entry = (self._normalize(folder_name), folder_name)
+        position = bisect.bisect_left(self._entries, entry)
+        if position == len(self._entries) or self._entries[position] != entry:
+            self._entries.insert(position, entry)
+
+    def remove(self, folder_name: str):
+        entry = (self._normalize(folder_name), folder_name)
+        position = bisect.bisect_left(self._entries, entry)
+        if position < len(self._entries) and self._entries[position] == entry:
+            del self._entries[position]
+
+    def search(self, prefix: str, limit: int = 20) -> List[str]:
+        """Folders cuyo nombre empieza por `prefix` (sin distinguir mayúsculas)"""
+        self.lookups += 1
+        key = self._normalize(prefix)
+        position = bisect.bisect_left(self._entries, (key, ""))
+        results = []
+        for normalized, name in self._entries[position:position + limit]:
+            if not normalized.startswith(key):
+                break
+            results.append(name)
+        return results
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "folders": len(self._entries),
+            "lookups": self.lookups,
+            "rebuilds": self.rebuilds
+        }
+
+# Instancia global del índice de folders
+folder_index = FolderPrefixIndex()
@@ -0,0 +1,76 @@
+import io
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from config import settings
+
+try:
+    from PIL import Image
+    PILLOW_AVAILABLE = True
+except ImportError:
+    Image = None
+    PILLOW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Formatos de salida soportados para variantes -> (formato Pillow, Content-Type)
+THUMBNAIL_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+def resize_image(data: bytes, width: int, image_format: str, quality: int) -> bytes:
+    """
+    Redimensiona una imagen al ancho indicado manteniendo la proporción.
+    Se ejecuta en un proceso separado, por eso es una función de módulo.
+    """
+    pil_format, _ = THUMBNAIL_FORMATS[image_format]
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft("RGB", (width, width))  # Decodificación reducida para JPEG
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        output = io.BytesIO()
+        image.save(output, format=pil_format, quality=quality)
+        return output.getvalue()
+
+class ThumbnailService:
+    """
+    Genera variantes redimensionadas en un pool de procesos para no bloquear el event loop
+    """
+
+    def __init__(self):
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def available(self) -> bool:
+        return PILLOW_AVAILABLE
+
+    async def initialize(self):
+        """Crear pool de procesos"""
+        if not PILLOW_AVAILABLE:
+            logger.warning("Pillow not installed, thumbnail generation disabled")
+            return
+        self.executor = ProcessPoolExecutor(max_workers=settings.thumbnail_workers)
+        logger.info(f"Thumbnail process pool started with {settings.thumbnail_workers} workers")
+
+    async def close(self):
+        """Cerrar pool de procesos"""
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+            logger.info("Thumbnail process pool closed")
+
+    async def resize(self, data: bytes, width: int, image_format: str) -> bytes:
+        """Redimensionar imagen fuera del event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, resize_image, data, width, image_format, settings.thumbnail_quality
+        )
+
+# Instancia global del servicio de miniaturas
+thumbnail_service = ThumbnailService()
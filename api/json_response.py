@@ -0,0 +1,58 @@
+import json
+import logging
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+from uuid import UUID
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+def _default(obj: Any) -> Any:
+    """Tipos que el encoder no serializa de forma nativa"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """
+    Serializar a JSON compacto en UTF-8. Usa orjson (datetime nativo, mucho
+    más rápido con strings grandes) y cae a la librería estándar si no está.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+        )
+    return json.dumps(
+        content,
+        default=_default,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """Respuesta JSON por defecto de la API, serializada con `dumps`"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+JSON_ENCODER_NAME = "orjson" if ORJSON_AVAILABLE else "json"
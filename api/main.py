@@ -1,13 +1,29 @@
-from fastapi import FastAPI, HTTPException, Query
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, TypeAdapter
 from typing import List, Optional
+import anyio
 import asyncpg
 import asyncio
-from datetime import datetime
+import base64
+import binascii
+import hashlib
+import json
+import mimetypes
+import os
+from datetime import date, datetime
 from contextlib import asynccontextmanager
+from functools import partial
 import logging
 from config import settings
-from cache_manager import cache_manager, cached
+from cache_manager import cache_manager, cached, EncodedBody, NegativeResult
+from image_processing import thumbnail_service, THUMBNAIL_FORMATS
+from db_notifications import DbChangeListener
+from json_response import FastJSONResponse, JSON_ENCODER_NAME, dumps
+from queries import query_registry, RegistryConnection
+from folder_index import folder_index
+from access_stats import access_tracker
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -34,6 +50,30 @@ class ImageResponse(BaseModel):
     image_size_mb: float
     created_at: datetime
 
+class ImagePageResponse(BaseModel):
+    items: List[ImageResponse]
+    next_cursor: Optional[str] = None
+
+# Metadata-only projection of ImageResponse (sin image_base64)
+class ImageManifestResponse(BaseModel):
+    id: int
+    folder_id: str
+    folder_name: str
+    folder_webviewlink: str
+    folder_modifiedtime: datetime
+    image_id: str
+    image_name: str
+    image_webviewlink: str
+    image_modifiedtime: datetime
+    image_size_mb: float
+    created_at: datetime
+
+class FolderCatalogEntry(BaseModel):
+    folder_name: str
+    image_count: int
+    total_size_mb: float
+    last_modified: Optional[datetime] = None
+
 # Pydantic models for Presentaciones
 class PresentacionBase(BaseModel):
     descripcion_producto: str
@@ -85,6 +125,30 @@ class PhlPtAllTablaResponse(PhlPtAllTablaBase):
     created_at: datetime
     updated_at: datetime
 
+# Serializadores para cuerpos de respuesta cacheados ya codificados
+IMAGE_LIST_ADAPTER = TypeAdapter(List[ImageResponse])
+IMAGE_MANIFEST_LIST_ADAPTER = TypeAdapter(List[ImageManifestResponse])
+PRESENTACION_LIST_ADAPTER = TypeAdapter(List[PresentacionResponse])
+PHL_PT_ALL_TABLA_LIST_ADAPTER = TypeAdapter(List[PhlPtAllTablaResponse])
+
+def encoded_body_response(body: EncodedBody, http_request: Request) -> Response:
+    """Devuelve un cuerpo ya serializado sin re-validar ni re-serializar"""
+    headers = {"Vary": "Accept-Encoding"}
+    if body.gzip_content is not None and "gzip" in http_request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=body.gzip_content, media_type=body.media_type, headers=headers)
+    return Response(content=body.content, media_type=body.media_type, headers=headers)
+
+# Tags de invalidación: cada entrada se registra bajo la tabla, folder o id del que deriva
+PRESENTACIONES_TAG = "table:presentaciones"
+PHL_PT_ALL_TABLA_TAG = "table:phl_pt_all_tabla"
+
+def folder_tag(folder_name: str) -> str:
+    return f"folder:{folder_name}"
+
+def presentacion_tag(presentacion_id: int) -> str:
+    return f"presentacion:{presentacion_id}"
+
 # Database connection pool management
 async def create_db_pool():
     """Create database connection pool"""
@@ -101,7 +165,10 @@ async def create_db_pool():
             command_timeout=60,
             server_settings={
                 'jit': 'off'  # Disable JIT for better connection performance
-            }
+            },
+            # Pre-preparar las queries del registro en cada conexión nueva
+            connection_class=RegistryConnection,
+            init=query_registry.init_connection
         )
         logger.info(f"Database pool created successfully with {settings.db_min_connections}-{settings.db_max_connections} connections")
     except Exception as e:
@@ -121,9 +188,27 @@ async def lifespan(app: FastAPI):
     # Startup
     await create_db_pool()
     await cache_manager.initialize()
+    await thumbnail_service.initialize()
+    snapshot_metadata = None
+    if settings.cache_snapshot_enabled:
+        snapshot_metadata = cache_manager.load_snapshot(settings.cache_snapshot_path)
+    await db_change_listener.start()
+    if snapshot_metadata is not None:
+        await validate_cache_snapshot(snapshot_metadata)
+    access_tracker.load()
+    global cache_warmup_task
+    if settings.cache_warmup_enabled:
+        cache_warmup_task = asyncio.create_task(run_cache_warmup_schedule())
     yield
     # Shutdown
+    if cache_warmup_task:
+        cache_warmup_task.cancel()
+    await access_tracker.save()
+    await db_change_listener.close()
+    if settings.cache_snapshot_enabled:
+        await save_cache_snapshot()
     await close_db_pool()
+    await thumbnail_service.close()
     await cache_manager.close()
 
 # Initialize FastAPI app with lifespan
@@ -131,7 +216,8 @@ app = FastAPI(
     title=settings.api_title,
     description=settings.api_description,
     version=settings.api_version,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # Dependency to get database connection from pool
@@ -154,7 +240,8 @@ async def root():
         "message": "API REST para consultar imágenes por folder_name",
         "version": settings.api_version,
         "port": settings.port,
-        "async_optimized": True
+        "async_optimized": True,
+        "json_encoder": JSON_ENCODER_NAME
     }
 
 # Health check endpoint
@@ -184,12 +271,16 @@ async def health_check():
             # Cache statistics
             cache_stats = await cache_manager.get_stats()
             
+            # Prepared statement statistics
+            statement_stats = query_registry.get_stats()
+            
             return {
                 "status": "healthy",
                 "database": "connected",
                 "port": settings.port,
                 "pool_stats": pool_stats,
                 "cache_stats": cache_stats,
+                "statement_stats": statement_stats,
                 "test_query": result
             }
     except Exception as e:
@@ -201,10 +292,30 @@ async def health_check():
             "error": str(e)
         }
 
+# Loader shared by the endpoint, single-flight and cache refresh
+async def load_images_by_folder(folder_name: str) -> EncodedBody:
+    """Lee de la DB las imágenes de un folder y las serializa a JSON"""
+    async with pool.acquire() as connection:
+        # Prepared statement from the query registry
+        rows = await query_registry.fetch(connection, "images_by_folder", folder_name)
+        
+        if not rows:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No se encontraron imágenes para el folder_name: {folder_name}"
+            )
+        
+        # Convert rows to response models efficiently
+        images = [ImageResponse(**dict(row)) for row in rows]
+        
+        logger.info(f"Successfully retrieved {len(images)} images for folder: {folder_name}")
+        return EncodedBody(IMAGE_LIST_ADAPTER.dump_json(images))
+
 # Optimized POST endpoint to get images by folder_name with cache
 @app.post("/images/by-folder", response_model=List[ImageResponse])
 async def get_images_by_folder(
     request: FolderRequest,
+    http_request: Request,
     use_cache: bool = Query(True, description="Usar cache para la respuesta")
 ):
     """
@@ -213,6 +324,8 @@ async def get_images_by_folder(
     if not pool:
         raise HTTPException(status_code=500, detail="Database pool not available")
     
+    access_tracker.record("images_by_folder", folder_name=request.folder_name)
+    
     # Generar clave de cache
     cache_key = cache_manager._generate_cache_key(
         "images_by_folder",
@@ -220,124 +333,579 @@ async def get_images_by_folder(
     )
     
     try:
-        # Intentar obtener del cache si está habilitado
+        # Una sola carga en vuelo por folder; las demás requests la esperan
+        if use_cache and settings.cache_enabled:
+            body = await cache_manager.get_or_load(
+                cache_key,
+                partial(load_images_by_folder, request.folder_name),
+                tags=[folder_tag(request.folder_name)]
+            )
+        else:
+            body = await load_images_by_folder(request.folder_name)
+        
+        return encoded_body_response(body, http_request)
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving images for folder {request.folder_name}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+
+def encode_page_cursor(created_at: datetime, row_id: int) -> str:
+    """Codifica la posición (created_at, id) como cursor opaco"""
+    payload = json.dumps({"c": created_at.isoformat(), "i": row_id})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_page_cursor(cursor: str) -> tuple:
+    """Decodifica un cursor opaco a la posición (created_at, id)"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(payload["c"]), int(payload["i"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+# Keyset-paginated folder images: one index range scan per page
+@app.post("/images/by-folder/page", response_model=ImagePageResponse)
+async def get_images_page_by_folder(
+    request: FolderRequest,
+    limit: int = Query(50, description="Imágenes por página", ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en next_cursor"),
+    use_cache: bool = Query(True, description="Usar cache para la respuesta")
+):
+    """
+    Obtiene una página de imágenes de un folder usando paginación por cursor
+    sobre (created_at, id)
+    """
+    if not pool:
+        raise HTTPException(status_code=500, detail="Database pool not available")
+    
+    position = decode_page_cursor(cursor) if cursor else None
+    
+    # Una entrada de cache por página, agrupadas bajo el prefijo del folder
+    folder_prefix = cache_manager._generate_cache_key(
+        "images_page_by_folder",
+        folder_name=request.folder_name
+    )
+    cache_key = cache_manager._generate_cache_key(
+        folder_prefix,
+        limit=limit,
+        cursor=cursor
+    )
+    
+    try:
         if use_cache and settings.cache_enabled:
             cached_result = await cache_manager.get(cache_key)
             if cached_result is not None:
-                logger.info(f"Cache hit for folder: {request.folder_name}")
-                # Convertir dict a ImageResponse objects
-                images = [ImageResponse(**item) for item in cached_result]
-                return images
+                logger.info(f"Cache hit for folder page: {request.folder_name}")
+                # Ya validado al cachearlo: orjson lo serializa sin jsonable_encoder
+                return FastJSONResponse(cached_result)
         
         async with pool.acquire() as connection:
-            # Optimized SQL query with proper indexing hint
-            query = """
-            SELECT 
-                id,
-                folder_id,
-                folder_name,
-                folder_webviewlink,
-                folder_modifiedtime,
-                image_id,
-                image_name,
-                image_webviewlink,
-                image_modifiedtime,
-                image_base64,
-                image_size_mb,
-                created_at
-            FROM images_fcl_drive
-            WHERE folder_name = $1
-            ORDER BY created_at DESC
-            """
-            
-            # Execute async query
-            rows = await connection.fetch(query, request.folder_name)
+            # Se pide una fila extra para saber si hay página siguiente
+            if position is None:
+                rows = await query_registry.fetch(
+                    connection, "images_page_first", request.folder_name, limit + 1
+                )
+            else:
+                rows = await query_registry.fetch(
+                    connection, "images_page_after", request.folder_name, position[0], position[1], limit + 1
+                )
             
-            if not rows:
+            if not rows and position is None:
                 raise HTTPException(
                     status_code=404,
                     detail=f"No se encontraron imágenes para el folder_name: {request.folder_name}"
                 )
             
-            # Convert rows to response models efficiently
-            images = [
-                ImageResponse(
-                    id=row['id'],
-                    folder_id=row['folder_id'],
-                    folder_name=row['folder_name'],
-                    folder_webviewlink=row['folder_webviewlink'],
-                    folder_modifiedtime=row['folder_modifiedtime'],
-                    image_id=row['image_id'],
-                    image_name=row['image_name'],
-                    image_webviewlink=row['image_webviewlink'],
-                    image_modifiedtime=row['image_modifiedtime'],
-                    image_base64=row['image_base64'],
-                    image_size_mb=row['image_size_mb'],
-                    created_at=row['created_at']
-                )
-                for row in rows
-            ]
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            images = [ImageResponse(**dict(row)) for row in rows]
+            next_cursor = None
+            if has_more:
+                last = rows[-1]
+                next_cursor = encode_page_cursor(last['created_at'], last['id'])
+            
+            page = ImagePageResponse(items=images, next_cursor=next_cursor).model_dump()
             
-            # Guardar en cache si está habilitado
             if use_cache and settings.cache_enabled:
-                # Convertir a dict para serializar
-                cache_data = [img.model_dump() for img in images]
-                await cache_manager.set(cache_key, cache_data)
-                logger.info(f"Cached {len(images)} images for folder: {request.folder_name}")
+                await cache_manager.set(cache_key, page, tags=[folder_tag(request.folder_name)])
+                logger.info(f"Cached page of {len(images)} images for folder: {request.folder_name}")
             
-            logger.info(f"Successfully retrieved {len(images)} images for folder: {request.folder_name}")
-            return images
+            logger.info(f"Successfully retrieved page of {len(images)} images for folder: {request.folder_name}")
+            return FastJSONResponse(page)
             
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error retrieving images for folder {request.folder_name}: {e}")
+        logger.error(f"Error retrieving image page for folder {request.folder_name}: {e}")
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
-# Optimized endpoint to get all unique folder names with cache
-@app.get("/folders", response_model=List[str])
-async def get_all_folders(use_cache: bool = Query(True, description="Usar cache para la respuesta")):
+# Streaming NDJSON endpoint backed by a server-side cursor
+@app.post("/images/by-folder/stream")
+async def stream_images_by_folder(request: FolderRequest):
     """
-    Obtiene todos los folder_name únicos disponibles (Optimizado con cache)
+    Transmite las imágenes de un folder como NDJSON (una imagen por línea)
+    usando un cursor del servidor; la memoria por request queda acotada
+    al tamaño del chunk. No usa cache.
+    """
+    if not pool:
+        raise HTTPException(status_code=500, detail="Database pool not available")
+    
+    query = query_registry.get_query("images_by_folder")
+    chunk_size = settings.db_stream_chunk_size
+    
+    # La conexión y la transacción deben vivir mientras dure el stream
+    connection = await pool.acquire()
+    transaction = connection.transaction()
+    released = False
+    
+    async def close_stream():
+        """
+        Rollback y devolución de la conexión al pool, una sola vez. Protegido
+        de la cancelación: al desconectarse el cliente, Starlette cancela el
+        stream y sin el shield el cleanup no llega a ejecutarse.
+        """
+        nonlocal released
+        if released:
+            return
+        released = True
+        with anyio.CancelScope(shield=True):
+            try:
+                if connection.is_in_transaction():
+                    await transaction.rollback()
+            except Exception as e:
+                logger.warning(f"Error rolling back stream for folder {request.folder_name}: {e}")
+            finally:
+                await pool.release(connection)
+    
+    try:
+        await transaction.start()
+        cursor = await connection.cursor(query, request.folder_name)
+        first_chunk = await cursor.fetch(chunk_size)
+    except Exception as e:
+        await close_stream()
+        logger.error(f"Error opening stream for folder {request.folder_name}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+    
+    if not first_chunk:
+        await close_stream()
+        raise HTTPException(
+            status_code=404,
+            detail=f"No se encontraron imágenes para el folder_name: {request.folder_name}"
+        )
+    
+    async def generate_lines():
+        streamed_count = 0
+        try:
+            rows = first_chunk
+            while rows:
+                for row in rows:
+                    yield ImageResponse(**dict(row)).model_dump_json() + "\n"
+                    streamed_count += 1
+                if len(rows) < chunk_size:
+                    break
+                rows = await cursor.fetch(chunk_size)
+            logger.info(f"Successfully streamed {streamed_count} images for folder: {request.folder_name}")
+        except Exception as e:
+            logger.error(f"Error streaming images for folder {request.folder_name}: {e}")
+            raise
+        finally:
+            await close_stream()
+    
+    # El background corre también si el generador nunca arrancó o quedó suspendido al cancelarse
+    return StreamingResponse(
+        generate_lines(),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(close_stream)
+    )
+
+# Metadata-only folder listing: never selects image_base64
+async def load_images_manifest_by_folder(folder_name: str) -> EncodedBody:
+    """Lee de la DB los metadatos de las imágenes de un folder y los serializa a JSON"""
+    async with pool.acquire() as connection:
+        rows = await query_registry.fetch(connection, "images_manifest_by_folder", folder_name)
+        
+        if not rows:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No se encontraron imágenes para el folder_name: {folder_name}"
+            )
+        
+        images = [ImageManifestResponse(**dict(row)) for row in rows]
+        
+        logger.info(f"Successfully retrieved manifest of {len(images)} images for folder: {folder_name}")
+        return EncodedBody(IMAGE_MANIFEST_LIST_ADAPTER.dump_json(images))
+
+@app.post("/images/by-folder/manifest", response_model=List[ImageManifestResponse])
+async def get_images_manifest_by_folder(
+    request: FolderRequest,
+    http_request: Request,
+    use_cache: bool = Query(True, description="Usar cache para la respuesta")
+):
+    """
+    Obtiene los metadatos de las imágenes de un folder sin el contenido base64
     """
     if not pool:
         raise HTTPException(status_code=500, detail="Database pool not available")
     
+    access_tracker.record("images_manifest_by_folder", folder_name=request.folder_name)
+    
     # Generar clave de cache
-    cache_key = "folders_list"
+    cache_key = cache_manager._generate_cache_key(
+        "images_manifest_by_folder",
+        folder_name=request.folder_name
+    )
     
     try:
-        # Intentar obtener del cache si está habilitado
         if use_cache and settings.cache_enabled:
-            cached_result = await cache_manager.get(cache_key)
-            if cached_result is not None:
-                logger.info("Cache hit for folders list")
-                return cached_result
+            body = await cache_manager.get_or_load(
+                cache_key,
+                partial(load_images_manifest_by_folder, request.folder_name),
+                tags=[folder_tag(request.folder_name)]
+            )
+        else:
+            body = await load_images_manifest_by_folder(request.folder_name)
         
+        return encoded_body_response(body, http_request)
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving manifest for folder {request.folder_name}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+
+# Firmas (magic numbers) para detectar el tipo de imagen decodificada
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+]
+
+def decode_image_base64(image_base64: str) -> bytes:
+    """Decodifica el contenido base64 de una imagen (acepta prefijo data URI)"""
+    if image_base64.startswith("data:"):
+        image_base64 = image_base64.split(",", 1)[-1]
+    return base64.b64decode(image_base64)
+
+def detect_image_media_type(data: bytes, image_name: Optional[str]) -> str:
+    """Detecta el Content-Type de una imagen por sus bytes o por su nombre"""
+    for signature, media_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return media_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    guessed_type, _ = mimetypes.guess_type(image_name or "")
+    return guessed_type or "application/octet-stream"
+
+async def fetch_image_meta(connection, image_id: str):
+    """Lee solo los metadatos de una imagen (evita traer image_base64)"""
+    meta = await query_registry.fetchrow(connection, "image_meta", image_id)
+    
+    if not meta:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Imagen con image_id {image_id} no encontrada"
+        )
+    return meta
+
+async def load_image_bytes(connection, image_id: str, meta, use_cache: bool):
+    """
+    Obtiene los bytes decodificados de una imagen, desde cache o desde la DB.
+    En un miss, metadatos y base64 salen de la misma fila en una sola query:
+    devuelve (meta, data) con los metadatos de esa fila, que pueden ser más
+    nuevos que `meta` si la imagen cambió entre ambas lecturas.
+    """
+    if use_cache and settings.cache_enabled:
+        data = cache_manager.get_image_bytes(image_id, meta['image_modifiedtime'])
+        if data is not None:
+            logger.info(f"Cache hit for raw image: {image_id}")
+            return meta, data
+    
+    row = await query_registry.fetchrow(connection, "image_with_base64", image_id)
+    
+    if not row:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Imagen con image_id {image_id} no encontrada"
+        )
+    if not row['image_base64']:
+        raise HTTPException(
+            status_code=404,
+            detail=f"La imagen {image_id} no tiene contenido"
+        )
+    
+    try:
+        data = decode_image_base64(row['image_base64'])
+    except (binascii.Error, ValueError):
+        raise HTTPException(
+            status_code=500,
+            detail=f"Contenido base64 inválido para la imagen {image_id}"
+        )
+    
+    if use_cache and settings.cache_enabled:
+        cache_manager.set_image_bytes(image_id, row['image_modifiedtime'], data)
+    return row, data
+
+def image_cache_headers(image_id: str, modified_time: datetime, variant: str = "") -> dict:
+    """Genera ETag y Cache-Control para una versión de imagen"""
+    etag_source = f"{image_id}:{modified_time}:{variant}"
+    return {
+        "ETag": '"' + hashlib.md5(etag_source.encode()).hexdigest()[:16] + '"',
+        "Cache-Control": f"public, max-age={settings.image_http_max_age}"
+    }
+
+# Binary endpoint: serve decoded image bytes instead of base64-in-JSON
+@app.get("/images/{image_id}/raw")
+async def get_image_raw(
+    image_id: str,
+    request: Request,
+    use_cache: bool = Query(True, description="Usar cache para la respuesta")
+):
+    """
+    Devuelve los bytes decodificados de una imagen con su Content-Type
+    """
+    if not pool:
+        raise HTTPException(status_code=500, detail="Database pool not available")
+    
+    try:
         async with pool.acquire() as connection:
-            # Optimized query for distinct folder names
-            query = """
-            SELECT DISTINCT folder_name 
-            FROM images_fcl_drive 
-            WHERE folder_name IS NOT NULL
-            ORDER BY folder_name
-            """
+            meta = await fetch_image_meta(connection, image_id)
+            modified_time = meta['image_modifiedtime']
+            headers = image_cache_headers(image_id, modified_time)
+            
+            # El cliente ya tiene esta versión en su cache HTTP
+            if request.headers.get("if-none-match") == headers["ETag"]:
+                return Response(status_code=304, headers=headers)
+            
+            meta, data = await load_image_bytes(connection, image_id, meta, use_cache)
+            if meta['image_modifiedtime'] != modified_time:
+                headers = image_cache_headers(image_id, meta['image_modifiedtime'])
+            
+            return Response(
+                content=data,
+                media_type=detect_image_media_type(data, meta['image_name']),
+                headers=headers
+            )
             
-            rows = await connection.fetch(query)
-            folder_names = [row['folder_name'] for row in rows]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving raw image {image_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+
+# Resized variants generated with Pillow in a process pool
+@app.get("/images/{image_id}/thumb")
+async def get_image_thumbnail(
+    image_id: str,
+    request: Request,
+    w: int = Query(256, description="Ancho máximo en píxeles", ge=16, le=2048),
+    image_format: str = Query("webp", alias="format", description="Formato de salida", pattern="^(jpeg|png|webp)$"),
+    use_cache: bool = Query(True, description="Usar cache para la respuesta")
+):
+    """
+    Devuelve una variante redimensionada de una imagen
+    """
+    if not pool:
+        raise HTTPException(status_code=500, detail="Database pool not available")
+    
+    if not thumbnail_service.available:
+        raise HTTPException(status_code=501, detail="Generación de miniaturas no disponible (Pillow no instalado)")
+    
+    try:
+        async with pool.acquire() as connection:
+            meta = await fetch_image_meta(connection, image_id)
+            modified_time = meta['image_modifiedtime']
+            headers = image_cache_headers(image_id, modified_time, f"{w}:{image_format}")
+            media_type = THUMBNAIL_FORMATS[image_format][1]
             
-            # Guardar en cache si está habilitado (TTL más largo para folders)
+            if request.headers.get("if-none-match") == headers["ETag"]:
+                return Response(status_code=304, headers=headers)
+            
+            variant_key = (image_id, modified_time, w, image_format)
             if use_cache and settings.cache_enabled:
-                await cache_manager.set(cache_key, folder_names, ttl=600)  # 10 minutes
-                logger.info(f"Cached {len(folder_names)} folder names")
+                thumbnail = cache_manager.get_image_variant(variant_key)
+                if thumbnail is not None:
+                    logger.info(f"Cache hit for thumbnail: {image_id} ({w}px {image_format})")
+                    return Response(content=thumbnail, media_type=media_type, headers=headers)
+            
+            meta, data = await load_image_bytes(connection, image_id, meta, use_cache)
+            if meta['image_modifiedtime'] != modified_time:
+                # La imagen cambió tras leer los metadatos: la variante es de la fila nueva
+                modified_time = meta['image_modifiedtime']
+                headers = image_cache_headers(image_id, modified_time, f"{w}:{image_format}")
+                variant_key = (image_id, modified_time, w, image_format)
+        
+        # Redimensionar fuera de la conexión para liberarla cuanto antes
+        try:
+            thumbnail = await thumbnail_service.resize(data, w, image_format)
+        except OSError as e:
+            raise HTTPException(
+                status_code=422,
+                detail=f"No se pudo procesar la imagen {image_id}: {str(e)}"
+            )
+        
+        if use_cache and settings.cache_enabled:
+            cache_manager.set_image_variant(variant_key, thumbnail)
+        
+        return Response(content=thumbnail, media_type=media_type, headers=headers)
             
-            logger.info(f"Successfully retrieved {len(folder_names)} unique folders")
-            return folder_names
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error generating thumbnail for image {image_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+
+async def load_all_folders() -> list:
+    """Lee de la DB los folder_name únicos"""
+    async with pool.acquire() as connection:
+        # Optimized query for distinct folder names
+        rows = await query_registry.fetch(connection, "folders_list")
+        folder_names = [row['folder_name'] for row in rows]
+        folder_index.rebuild(folder_names)
+        
+        logger.info(f"Successfully retrieved {len(folder_names)} unique folders")
+        return folder_names
+
+# Optimized endpoint to get all unique folder names with cache
+@app.get("/folders", response_model=List[str])
+async def get_all_folders(use_cache: bool = Query(True, description="Usar cache para la respuesta")):
+    """
+    Obtiene todos los folder_name únicos disponibles (Optimizado con cache)
+    """
+    if not pool:
+        raise HTTPException(status_code=500, detail="Database pool not available")
+    
+    # Generar clave de cache
+    cache_key = "folders_list"
+    
+    try:
+        # TTL más largo para folders: ver cache_partitions["folders"]
+        if use_cache and settings.cache_enabled:
+            return await cache_manager.get_or_load(cache_key, load_all_folders)
+        
+        return await load_all_folders()
             
     except Exception as e:
         logger.error(f"Error retrieving folders: {e}")
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
+def build_folder_catalog_entry(row) -> dict:
+    return FolderCatalogEntry(
+        folder_name=row['folder_name'],
+        image_count=row['image_count'],
+        total_size_mb=float(row['total_size_mb']),
+        last_modified=row['last_modified']
+    ).model_dump()
+
+async def load_folder_catalog() -> dict:
+    """Lee de la DB el agregado por folder (conteo, tamaño y última modificación)"""
+    async with pool.acquire() as connection:
+        rows = await query_registry.fetch(connection, "folder_catalog")
+        catalog = {row['folder_name']: build_folder_catalog_entry(row) for row in rows}
+        
+        logger.info(f"Successfully retrieved catalog of {len(catalog)} folders")
+        return catalog
+
+async def refresh_folder_catalog(folder_names: List[str]):
+    """
+    Actualiza en el catálogo cacheado solo los folders modificados, en lugar
+    de descartar y recalcular el agregado completo
+    """
+    catalog = await cache_manager.get("folders_catalog")
+    if catalog is None:
+        return
+    
+    try:
+        async with pool.acquire() as connection:
+            rows = await query_registry.fetch(connection, "folder_catalog_by_folders", folder_names)
+    except Exception as e:
+        # Sin el agregado parcial, descartar el catálogo para que se recalcule completo
+        logger.error(f"Error refreshing folder catalog, dropping cached catalog: {e}")
+        await cache_manager.delete("folders_catalog")
+        return
+    
+    catalog = dict(catalog)
+    for folder_name in folder_names:
+        catalog.pop(folder_name, None)
+    for row in rows:
+        catalog[row['folder_name']] = build_folder_catalog_entry(row)
+    
+    # Mantener el orden por folder_name de la query completa
+    catalog = dict(sorted(catalog.items()))
+    await cache_manager.set("folders_catalog", catalog, loader=load_folder_catalog)
+    logger.info(f"Refreshed {len(folder_names)} folders in cached catalog")
+
+@app.get("/folders/catalog", response_model=List[FolderCatalogEntry])
+async def get_folder_catalog(use_cache: bool = Query(True, description="Usar cache para la respuesta")):
+    """
+    Obtiene para cada folder el conteo de imágenes, el tamaño total y la
+    última modificación en una sola query agregada
+    """
+    if not pool:
+        raise HTTPException(status_code=500, detail="Database pool not available")
+    
+    try:
+        if use_cache and settings.cache_enabled:
+            catalog = await cache_manager.get_or_load("folders_catalog", load_folder_catalog)
+        else:
+            catalog = await load_folder_catalog()
+        
+        # Entradas ya validadas (FolderCatalogEntry): sin pasar por jsonable_encoder
+        return FastJSONResponse(list(catalog.values()))
+            
+    except Exception as e:
+        logger.error(f"Error retrieving folder catalog: {e}")
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+
+async def refresh_folder_index(folder_names: List[str]):
+    """Agregar o quitar del índice de prefijos los folders modificados"""
+    if not folder_index.ready:
+        return
+    
+    try:
+        async with pool.acquire() as connection:
+            rows = await query_registry.fetch(connection, "folders_existing", folder_names)
+    except Exception as e:
+        logger.error(f"Error refreshing folder index, rebuilding on next search: {e}")
+        folder_index.invalidate()
+        return
+    
+    existing = {row['folder_name'] for row in rows}
+    for folder_name in folder_names:
+        if folder_name in existing:
+            folder_index.add(folder_name)
+        else:
+            folder_index.remove(folder_name)
+
+@app.get("/folders/search", response_model=List[str])
+async def search_folders(
+    prefix: str = Query(..., min_length=1, description="Prefijo del folder_name"),
+    limit: int = Query(20, ge=1, le=1000, description="Límite de resultados")
+):
+    """
+    Autocompletado de folder_name por prefijo desde el índice en memoria
+    """
+    try:
+        if not folder_index.ready:
+            # Primera búsqueda: construir el índice desde la lista de folders cacheada
+            if settings.cache_enabled:
+                folders = await cache_manager.get_or_load("folders_list", load_all_folders)
+            else:
+                if not pool:
+                    raise HTTPException(status_code=500, detail="Database pool not available")
+                folders = await load_all_folders()
+            folder_index.rebuild(folders)
+        
+        return folder_index.search(prefix, limit)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error searching folders with prefix {prefix}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+
 # New endpoint: Get image count by folder
 @app.get("/folders/{folder_name}/count")
 async def get_image_count_by_folder(folder_name: str):
@@ -348,9 +916,17 @@ async def get_image_count_by_folder(folder_name: str):
         raise HTTPException(status_code=500, detail="Database pool not available")
     
     try:
+        # Si el catálogo está en cache, el conteo sale de ahí sin ir a la DB
+        catalog = await cache_manager.get("folders_catalog")
+        if catalog is not None:
+            entry = catalog.get(folder_name)
+            return {
+                "folder_name": folder_name,
+                "image_count": entry['image_count'] if entry else 0
+            }
+        
         async with pool.acquire() as connection:
-            query = "SELECT COUNT(*) as count FROM images_fcl_drive WHERE folder_name = $1"
-            result = await connection.fetchrow(query, folder_name)
+            result = await query_registry.fetchrow(connection, "folder_image_count", folder_name)
             
             return {
                 "folder_name": folder_name,
@@ -362,10 +938,41 @@ async def get_image_count_by_folder(folder_name: str):
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
 # New endpoint: Batch processing for multiple folders
+# Variantes de la carga por folder que comparten entradas de cache con el batch
+FOLDER_BATCH_VARIANTS = {
+    False: ("images_by_folder", "images_by_folders", ImageResponse, IMAGE_LIST_ADAPTER),
+    True: ("images_manifest_by_folder", "images_manifest_by_folders", ImageManifestResponse, IMAGE_MANIFEST_LIST_ADAPTER),
+}
+
+async def load_images_by_folders(folder_names: List[str], manifest: bool = False) -> dict:
+    """
+    Lee de la DB las imágenes de varios folders con una sola query
+    (`folder_name = ANY($1)`) y devuelve un EncodedBody por folder encontrado
+    """
+    _, query_name, model, adapter = FOLDER_BATCH_VARIANTS[manifest]
+    async with pool.acquire() as connection:
+        rows = await query_registry.fetch(connection, query_name, folder_names)
+    
+    # Filas ordenadas por folder_name, created_at DESC: agrupar por folder
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row["folder_name"], []).append(model(**dict(row)))
+    
+    logger.info(f"Successfully retrieved {len(rows)} images for {len(grouped)}/{len(folder_names)} folders in batch")
+    return {
+        folder_name: EncodedBody(adapter.dump_json(images))
+        for folder_name, images in grouped.items()
+    }
+
 @app.post("/images/batch-folders")
-async def get_images_batch_folders(folder_names: List[str]):
+async def get_images_batch_folders(
+    folder_names: List[str],
+    use_cache: bool = Query(True, description="Usar cache para la respuesta"),
+    manifest: bool = Query(False, description="Solo metadatos, sin image_base64")
+):
     """
-    Obtiene imágenes para múltiples folders de forma simultánea
+    Obtiene imágenes para múltiples folders: los folders en cache se sirven
+    desde el cache y los restantes con una sola query a la DB
     """
     if not pool:
         raise HTTPException(status_code=500, detail="Database pool not available")
@@ -373,34 +980,90 @@ async def get_images_batch_folders(folder_names: List[str]):
     if not folder_names:
         raise HTTPException(status_code=400, detail="Lista de folder_names no puede estar vacía")
     
-    if len(folder_names) > 10:  # Limit batch size
-        raise HTTPException(status_code=400, detail="Máximo 10 folders por batch")
+    # Sin duplicados, conservando el orden pedido
+    folder_names = list(dict.fromkeys(folder_names))
+    
+    # Con image_base64 cada folder puede pesar MBs: límite mucho menor que solo metadatos
+    max_folders = settings.batch_max_folders if manifest else settings.batch_max_full_folders
+    if len(folder_names) > max_folders:  # Limit batch size
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                f"Máximo {max_folders} folders por batch"
+                + ("" if manifest else f" con imágenes; usar manifest=true para hasta {settings.batch_max_folders}")
+            )
+        )
+    
+    cache_prefix, _, _, _ = FOLDER_BATCH_VARIANTS[manifest]
+    folder_loader = load_images_manifest_by_folder if manifest else load_images_by_folder
+    for folder_name in folder_names:
+        access_tracker.record(cache_prefix, folder_name=folder_name)
+    cache_keys = {
+        folder_name: cache_manager._generate_cache_key(cache_prefix, folder_name=folder_name)
+        for folder_name in folder_names
+    }
     
     try:
-        # Execute all queries concurrently
-        async def get_folder_images(folder_name: str):
-            async with pool.acquire() as connection:
-                query = """
-                SELECT folder_name, COUNT(*) as count
-                FROM images_fcl_drive
-                WHERE folder_name = $1
-                GROUP BY folder_name
-                """
-                result = await connection.fetchrow(query, folder_name)
-                return {
-                    "folder_name": folder_name,
-                    "image_count": result['count'] if result else 0
+        bodies = {}
+        known_missing = set()
+        if use_cache and settings.cache_enabled:
+            cached_bodies = await cache_manager.get_many(
+                list(cache_keys.values()),
+                loaders={
+                    cache_key: partial(folder_loader, folder_name)
+                    for folder_name, cache_key in cache_keys.items()
                 }
+            )
+            for folder_name, cache_key in cache_keys.items():
+                cached_body = cached_bodies.get(cache_key)
+                if isinstance(cached_body, NegativeResult):
+                    # 404 cacheado: no se vuelve a consultar
+                    cache_manager.negative_hits += 1
+                    known_missing.add(folder_name)
+                elif cached_body is not None:
+                    bodies[folder_name] = cached_body
+        
+        missing = [
+            folder_name for folder_name in folder_names
+            if folder_name not in bodies and folder_name not in known_missing
+        ]
+        if missing:
+            loaded = await load_images_by_folders(missing, manifest)
+            bodies.update(loaded)
+            
+            # Guardar cada folder en su propia entrada, compartida con /images/by-folder,
+            # con un solo pipeline al L2
+            if use_cache and settings.cache_enabled:
+                await cache_manager.set_many(
+                    {
+                        cache_keys[folder_name]: (
+                            loaded[folder_name] if folder_name in loaded
+                            else NegativeResult(f"No se encontraron imágenes para el folder_name: {folder_name}")
+                        )
+                        for folder_name in missing
+                    },
+                    loaders={cache_keys[folder_name]: partial(folder_loader, folder_name) for folder_name in loaded},
+                    tags={cache_keys[folder_name]: [folder_tag(folder_name)] for folder_name in missing}
+                )
         
-        # Run all queries concurrently
-        tasks = [get_folder_images(folder_name) for folder_name in folder_names]
-        results = await asyncio.gather(*tasks)
+        logger.info(f"Batch of {len(folder_names)} folders: {len(folder_names) - len(missing)} from cache, {len(missing)} from DB")
         
-        return {
-            "total_folders": len(folder_names),
-            "results": results
-        }
+        # Ensamblar la respuesta con los cuerpos JSON ya serializados de cada folder
+        results = b",".join(
+            dumps(folder_name) + b":" + bodies[folder_name].content
+            for folder_name in folder_names
+            if folder_name in bodies
+        )
+        not_found = [folder_name for folder_name in folder_names if folder_name not in bodies]
+        content = (
+            b'{"total_folders":' + str(len(folder_names)).encode()
+            + b',"results":{' + results
+            + b'},"not_found":' + dumps(not_found) + b"}"
+        )
+        return Response(content=content, media_type="application/json")
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in batch processing: {e}")
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
@@ -411,7 +1074,11 @@ async def get_cache_stats():
     """
     Obtiene estadísticas detalladas del cache
     """
-    return await cache_manager.get_stats()
+    stats = await cache_manager.get_stats()
+    stats["db_notifications"] = db_change_listener.get_stats()
+    stats["folder_index"] = folder_index.get_stats()
+    stats["access"] = access_tracker.get_stats()
+    return stats
 
 @app.delete("/cache/clear")
 async def clear_cache():
@@ -420,6 +1087,7 @@ async def clear_cache():
     """
     try:
         deleted_count = await cache_manager.clear_pattern("*")
+        folder_index.invalidate()
         return {
             "message": "Cache cleared successfully",
             "deleted_entries": deleted_count
@@ -428,17 +1096,17 @@ async def clear_cache():
         logger.error(f"Error clearing cache: {e}")
         raise HTTPException(status_code=500, detail=f"Error clearing cache: {str(e)}")
 
+async def invalidate_folder_cache(folder_name: str) -> bool:
+    """Elimina todas las entradas de cache derivadas de un folder (imágenes, manifiesto y páginas)"""
+    return await cache_manager.invalidate_tag(folder_tag(folder_name)) > 0
+
 @app.delete("/cache/clear/{folder_name}")
 async def clear_folder_cache(folder_name: str):
     """
     Limpia el cache para un folder específico
     """
     try:
-        cache_key = cache_manager._generate_cache_key(
-            "images_by_folder",
-            folder_name=folder_name
-        )
-        success = await cache_manager.delete(cache_key)
+        success = await invalidate_folder_cache(folder_name)
         
         return {
             "message": f"Cache cleared for folder: {folder_name}",
@@ -448,36 +1116,243 @@ async def clear_folder_cache(folder_name: str):
         logger.error(f"Error clearing folder cache: {e}")
         raise HTTPException(status_code=500, detail=f"Error clearing folder cache: {str(e)}")
 
-@app.post("/cache/warm-up")
-async def warm_up_cache():
+# Postgres LISTEN/NOTIFY-driven invalidation (see sql/cache_invalidation_triggers.sql)
+async def apply_db_changes(changes: List[dict]):
     """
-    Pre-carga el cache con los folders más comunes
+    Invalida solo las entradas afectadas por un lote de cambios notificados
+    por los triggers de la base de datos
     """
+    folder_names = set()
+    presentacion_ids = set()
+    folders_list_changed = False
+    phl_changed = False
+    
+    for change in changes:
+        table = change.get("table")
+        if table == "images_fcl_drive":
+            for folder_name in (change.get("key"), change.get("old_key")):
+                if folder_name:
+                    folder_names.add(folder_name)
+            # INSERT/DELETE o cambio de folder pueden alterar la lista de folders
+            if change.get("op") != "UPDATE" or change.get("old_key"):
+                folders_list_changed = True
+        elif table == "phl_pt_all_tabla":
+            # Cualquier fila puede desplazar páginas LIMIT/OFFSET: se invalida la tabla
+            phl_changed = True
+        elif table == "presentaciones" and change.get("key") is not None:
+            presentacion_ids.add(int(change["key"]))
+    
+    for folder_name in folder_names:
+        await invalidate_folder_cache(folder_name)
+    if folder_names:
+        await refresh_folder_catalog(sorted(folder_names))
+    if folders_list_changed:
+        await cache_manager.delete("folders_list")
+        await refresh_folder_index(sorted(folder_names))
+    if phl_changed:
+        await cache_manager.invalidate_tag(PHL_PT_ALL_TABLA_TAG)
+    if presentacion_ids:
+        await cache_manager.invalidate_tag(PRESENTACIONES_TAG)
+        for presentacion_id in presentacion_ids:
+            await cache_manager.invalidate_tag(presentacion_tag(presentacion_id))
+    
+    logger.info(
+        f"Applied {len(changes)} database change notifications "
+        f"({len(folder_names)} folders, {len(presentacion_ids)} presentaciones, phl: {phl_changed})"
+    )
+
+async def clear_cache_after_reconnect():
+    """Tras perder el listener no se sabe qué cambió: limpiar todo"""
+    await cache_manager.clear_pattern("*")
+    folder_index.invalidate()
+
+db_change_listener = DbChangeListener(apply_db_changes, on_reconnect=clear_cache_after_reconnect)
+
+# Warm restart: snapshot del cache en memoria validado contra la DB al arrancar
+SNAPSHOT_TABLE_NAMESPACES = {
+    "images_fcl_drive": ("folders_list", "folders_catalog"),
+    "presentaciones": ("presentaciones_all", "presentacion_by_id"),
+    "phl_pt_all_tabla": ("phl_pt_all_tabla_all", "phl_pt_all_tabla_date_range"),
+}
+
+async def fetch_snapshot_fingerprints(folder_names: List[str]) -> dict:
+    """Marcas de agua por tabla y huella (conteo, tamaño, última modificación) por folder"""
+    async with pool.acquire() as connection:
+        watermarks = {
+            row['table_name']: (row['row_count'], row['last_change'], row['last_modified'])
+            for row in await query_registry.fetch(connection, "table_watermarks")
+        }
+        folders = {}
+        if folder_names:
+            rows = await query_registry.fetch(connection, "folder_catalog_by_folders", folder_names)
+            folders = {
+                row['folder_name']: (row['image_count'], float(row['total_size_mb']), row['last_modified'])
+                for row in rows
+            }
+    return {"watermarks": watermarks, "folders": folders}
+
+def snapshot_folder_names() -> List[str]:
+    return sorted(tag.split(":", 1)[1] for tag in cache_manager.local_tags("folder:"))
+
+async def save_cache_snapshot():
+    """Guardar el cache en memoria junto con las huellas de la DB en las que se basa"""
+    if not pool:
+        return
     try:
-        # Obtener lista de folders (esto se cacheará)
-        folders = await get_all_folders(use_cache=True)
-        
-        # Pre-cargar los primeros 10 folders más comunes
-        warm_up_folders = folders[:10] if len(folders) >= 10 else folders
-        
-        warmed_count = 0
-        for folder_name in warm_up_folders:
+        metadata = await fetch_snapshot_fingerprints(snapshot_folder_names())
+    except Exception as e:
+        # Sin huellas no se podría validar al arrancar: mejor no dejar snapshot
+        logger.error(f"Could not fingerprint database for cache snapshot, skipping it: {e}")
+        if os.path.exists(settings.cache_snapshot_path):
+            os.remove(settings.cache_snapshot_path)
+        return
+    await cache_manager.save_snapshot(settings.cache_snapshot_path, metadata)
+
+async def validate_cache_snapshot(metadata: dict):
+    """
+    Descartar del snapshot recargado lo que cambió en la DB mientras la API
+    estuvo detenida (las notificaciones de ese intervalo se perdieron)
+    """
+    try:
+        current = await fetch_snapshot_fingerprints(snapshot_folder_names())
+    except Exception as e:
+        logger.error(f"Could not validate cache snapshot, discarding it: {e}")
+        await cache_manager.clear_pattern("*")
+        return
+    
+    changed_tables = [
+        table for table in SNAPSHOT_TABLE_NAMESPACES
+        if current["watermarks"].get(table) != metadata.get("watermarks", {}).get(table)
+    ]
+    for table in changed_tables:
+        for namespace in SNAPSHOT_TABLE_NAMESPACES[table]:
+            await cache_manager.clear_pattern(f"{namespace}*")
+    
+    # Siempre por folder: la marca de agua de la tabla es agregada y un UPDATE
+    # puede no moverla aunque cambie la huella (conteo, tamaño, modificación) del folder
+    stale_folders = []
+    saved_folders = metadata.get("folders", {})
+    for folder_name in snapshot_folder_names():
+        if current["folders"].get(folder_name) != saved_folders.get(folder_name):
+            stale_folders.append(folder_name)
+            await cache_manager.invalidate_tag(folder_tag(folder_name))
+    
+    logger.info(
+        f"Validated cache snapshot: changed tables {changed_tables}, "
+        f"{len(stale_folders)} stale folders dropped"
+    )
+
+# Prefijos de cache que el warm-up sabe recargar a partir de sus parámetros
+WARMUP_PREFIXES = ("images_by_folder", "images_manifest_by_folder", "phl_pt_all_tabla_date_range")
+
+def build_warmup_loader(prefix: str, params: dict):
+    """
+    Loader y tags equivalentes a los del endpoint para una clave registrada
+    por access_tracker, o (None, None) si el prefijo no se sabe recargar
+    """
+    if prefix == "images_by_folder":
+        return partial(load_images_by_folder, params["folder_name"]), [folder_tag(params["folder_name"])]
+    if prefix == "images_manifest_by_folder":
+        return partial(load_images_manifest_by_folder, params["folder_name"]), [folder_tag(params["folder_name"])]
+    if prefix == "phl_pt_all_tabla_date_range":
+        fecha_inicio = parse_date_param(params["fecha_inicio"])
+        fecha_fin = parse_date_param(params["fecha_fin"])
+        if params["pg_json"]:
+            loader = partial(
+                load_phl_pt_all_tabla_pg_json,
+                params["limit"], params["offset"], fecha_inicio, fecha_fin
+            )
+        else:
+            loader = partial(
+                load_phl_pt_all_tabla_by_date_range,
+                fecha_inicio, fecha_fin, params["limit"], params["offset"]
+            )
+        return loader, [PHL_PT_ALL_TABLA_TAG]
+    return None, None
+
+def warmup_interval_seconds() -> float:
+    """
+    Intervalo entre warm-ups: el configurado, acotado por la ventana stale más
+    corta de los namespaces que recarga. Así cada clave caliente recibe un hit
+    entre su soft y su hard TTL, que la refresca antes de que expire
+    """
+    windows = [cache_manager.stale_window(prefix) for prefix in WARMUP_PREFIXES]
+    return min([settings.cache_warmup_interval_seconds, *(window for window in windows if window > 0)])
+
+async def warm_up_hot_keys(top_n: int) -> dict:
+    """
+    Carga concurrentemente las claves más accedidas, con un semáforo acotado
+    a una fracción del pool para no dejar sin conexiones al tráfico real
+    """
+    targets = [(entry.prefix, entry.params) for entry in access_tracker.top(top_n, WARMUP_PREFIXES)]
+    if not targets:
+        # Sin historial de accesos (primer arranque): los primeros folders de la lista
+        folders = await cache_manager.get_or_load("folders_list", load_all_folders, track=False)
+        targets = [("images_by_folder", {"folder_name": name}) for name in folders[:top_n]]
+    
+    concurrency = max(1, int(pool.get_max_size() * settings.cache_warmup_pool_fraction))
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def warm(prefix: str, params: dict) -> str:
+        loader, tags = build_warmup_loader(prefix, params)
+        if loader is None:
+            return "skipped"
+        cache_key = cache_manager._generate_cache_key(prefix, **params)
+        async with semaphore:
             try:
-                # Simular request para cachear
-                request = FolderRequest(folder_name=folder_name)
-                await get_images_by_folder(request, use_cache=True)
-                warmed_count += 1
+                # track=False: el warm-up no cuenta como hit/miss ni alimenta el sketch
+                await cache_manager.get_or_load(cache_key, loader, tags=tags, track=False)
+                return "warmed"
             except HTTPException as e:
                 if e.status_code == 404:
-                    # Es normal que algunos folders no tengan imágenes
-                    continue
-                else:
-                    raise
-        
+                    # La clave ya no tiene datos: dejar de considerarla caliente
+                    access_tracker.forget(prefix, **params)
+                    return "skipped"
+                raise
+    
+    results = await asyncio.gather(*(warm(prefix, params) for prefix, params in targets), return_exceptions=True)
+    failed = [result for result in results if isinstance(result, Exception)]
+    for error in failed:
+        logger.warning(f"Cache warm-up load failed: {error}")
+    
+    summary = {
+        "targets": len(targets),
+        "warmed": sum(1 for result in results if result == "warmed"),
+        "skipped": sum(1 for result in results if result == "skipped"),
+        "failed": len(failed),
+        "concurrency": concurrency
+    }
+    logger.info(f"Cache warm-up: {summary}")
+    return summary
+
+async def run_cache_warmup_schedule():
+    """Warm-up al arrancar y luego cada `warmup_interval_seconds()`"""
+    while True:
+        try:
+            if pool and settings.cache_enabled:
+                await warm_up_hot_keys(settings.cache_warmup_top_n)
+            await access_tracker.save()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Scheduled cache warm-up failed: {e}")
+        await asyncio.sleep(warmup_interval_seconds())
+
+cache_warmup_task: Optional[asyncio.Task] = None
+
+@app.post("/cache/warm-up")
+async def warm_up_cache(top_n: Optional[int] = Query(None, ge=1, le=500, description="Número de claves más accedidas a pre-cargar")):
+    """
+    Pre-carga el cache con los folders y rangos de fechas más accedidos
+    """
+    if not pool:
+        raise HTTPException(status_code=500, detail="Database pool not available")
+    
+    try:
+        summary = await warm_up_hot_keys(top_n or settings.cache_warmup_top_n)
         return {
             "message": "Cache warm-up completed",
-            "warmed_folders": warmed_count,
-            "total_folders": len(warm_up_folders)
+            **summary
         }
         
     except Exception as e:
@@ -488,8 +1363,31 @@ async def warm_up_cache():
 # PRESENTACIONES ENDPOINTS
 # ============================================================================
 
+async def load_presentaciones(limit: Optional[int], offset: int) -> EncodedBody:
+    """Lee de la DB las presentaciones con paginación opcional"""
+    async with pool.acquire() as connection:
+        # LIMIT NULL = sin límite: un solo statement preparado para todas las páginas
+        rows = await query_registry.fetch(connection, "presentaciones_page", limit, offset)
+        
+        presentaciones = [
+            PresentacionResponse(
+                id=row['id'],
+                descripcion_producto=row['descripcion_producto'],
+                peso_caja=float(row['peso_caja']),
+                sobre_peso=float(row['sobre_peso']),
+                esquinero_adicionales=row['esquinero_adicionales'],
+                created_at=row['created_at'],
+                updated_at=row['updated_at']
+            )
+            for row in rows
+        ]
+        
+        logger.info(f"Successfully retrieved {len(presentaciones)} presentaciones")
+        return EncodedBody(PRESENTACION_LIST_ADAPTER.dump_json(presentaciones))
+
 @app.get("/presentaciones", response_model=List[PresentacionResponse])
 async def get_all_presentaciones(
+    http_request: Request,
     use_cache: bool = Query(True, description="Usar cache para la respuesta"),
     limit: Optional[int] = Query(None, description="Límite de resultados", ge=1, le=1000),
     offset: Optional[int] = Query(0, description="Offset para paginación", ge=0)
@@ -508,61 +1406,45 @@ async def get_all_presentaciones(
     )
     
     try:
-        # Try to get from cache if enabled
         if use_cache and settings.cache_enabled:
-            cached_result = await cache_manager.get(cache_key)
-            if cached_result is not None:
-                logger.info(f"Cache hit for presentaciones list (limit: {limit}, offset: {offset})")
-                return [PresentacionResponse(**item) for item in cached_result]
+            body = await cache_manager.get_or_load(
+                cache_key,
+                partial(load_presentaciones, limit, offset),
+                tags=[PRESENTACIONES_TAG]
+            )
+        else:
+            body = await load_presentaciones(limit, offset)
         
-        async with pool.acquire() as connection:
-            # Build query with optional pagination
-            base_query = """
-            SELECT 
-                id,
-                descripcion_producto,
-                peso_caja,
-                sobre_peso,
-                esquinero_adicionales,
-                created_at,
-                updated_at
-            FROM presentaciones
-            ORDER BY created_at DESC
-            """
-            
-            if limit is not None:
-                query = base_query + f" LIMIT {limit} OFFSET {offset}"
-            else:
-                query = base_query
-            
-            rows = await connection.fetch(query)
-            
-            presentaciones = [
-                PresentacionResponse(
-                    id=row['id'],
-                    descripcion_producto=row['descripcion_producto'],
-                    peso_caja=float(row['peso_caja']),
-                    sobre_peso=float(row['sobre_peso']),
-                    esquinero_adicionales=row['esquinero_adicionales'],
-                    created_at=row['created_at'],
-                    updated_at=row['updated_at']
-                )
-                for row in rows
-            ]
-            
-            # Save to cache if enabled
-            if use_cache and settings.cache_enabled:
-                cache_data = [presentacion.model_dump() for presentacion in presentaciones]
-                await cache_manager.set(cache_key, cache_data)
-                logger.info(f"Cached {len(presentaciones)} presentaciones")
-            
-            logger.info(f"Successfully retrieved {len(presentaciones)} presentaciones")
-            return presentaciones
+        return encoded_body_response(body, http_request)
             
     except Exception as e:
         logger.error(f"Error retrieving presentaciones: {e}")
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
+async def load_presentacion_by_id(presentacion_id: int) -> dict:
+    """Lee de la DB una presentación por ID"""
+    async with pool.acquire() as connection:
+        row = await query_registry.fetchrow(connection, "presentacion_by_id", presentacion_id)
+        
+        if not row:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Presentación con ID {presentacion_id} no encontrada"
+            )
+        
+        presentacion = PresentacionResponse(
+            id=row['id'],
+            descripcion_producto=row['descripcion_producto'],
+            peso_caja=float(row['peso_caja']),
+            sobre_peso=float(row['sobre_peso']),
+            esquinero_adicionales=row['esquinero_adicionales'],
+            created_at=row['created_at'],
+            updated_at=row['updated_at']
+        )
+        
+        logger.info(f"Successfully retrieved presentacion ID: {presentacion_id}")
+        return presentacion.model_dump()
+
 @app.get("/presentaciones/{presentacion_id}", response_model=PresentacionResponse)
 async def get_presentacion_by_id(
     presentacion_id: int,
@@ -581,52 +1463,18 @@ async def get_presentacion_by_id(
     )
     
     try:
-        # Try to get from cache if enabled
+        # Los IDs inexistentes quedan cacheados como 404 (entrada negativa)
         if use_cache and settings.cache_enabled:
-            cached_result = await cache_manager.get(cache_key)
-            if cached_result is not None:
-                logger.info(f"Cache hit for presentacion ID: {presentacion_id}")
-                return PresentacionResponse(**cached_result)
-        
-        async with pool.acquire() as connection:
-            query = """
-            SELECT 
-                id,
-                descripcion_producto,
-                peso_caja,
-                sobre_peso,
-                esquinero_adicionales,
-                created_at,
-                updated_at
-            FROM presentaciones
-            WHERE id = $1
-            """
-            
-            row = await connection.fetchrow(query, presentacion_id)
-            
-            if not row:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Presentación con ID {presentacion_id} no encontrada"
-                )
-            
-            presentacion = PresentacionResponse(
-                id=row['id'],
-                descripcion_producto=row['descripcion_producto'],
-                peso_caja=float(row['peso_caja']),
-                sobre_peso=float(row['sobre_peso']),
-                esquinero_adicionales=row['esquinero_adicionales'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at']
+            presentacion = await cache_manager.get_or_load(
+                cache_key,
+                partial(load_presentacion_by_id, presentacion_id),
+                tags=[presentacion_tag(presentacion_id)]
             )
-            
-            # Save to cache if enabled
-            if use_cache and settings.cache_enabled:
-                await cache_manager.set(cache_key, presentacion.model_dump())
-                logger.info(f"Cached presentacion ID: {presentacion_id}")
-            
-            logger.info(f"Successfully retrieved presentacion ID: {presentacion_id}")
-            return presentacion
+        else:
+            presentacion = await load_presentacion_by_id(presentacion_id)
+        
+        # Ya validada en load_presentacion_by_id: sin re-validar ni jsonable_encoder
+        return FastJSONResponse(presentacion)
             
     except HTTPException:
         raise
@@ -683,7 +1531,9 @@ async def create_presentacion(presentacion: PresentacionCreate):
             
             # Clear related cache entries
             if settings.cache_enabled:
-                await cache_manager.clear_pattern("presentaciones_all*")
+                await cache_manager.invalidate_tag(PRESENTACIONES_TAG)
+                # Un 404 cacheado para este ID ya no es válido
+                await cache_manager.invalidate_tag(presentacion_tag(new_presentacion.id))
                 logger.info("Cleared presentaciones list cache after creation")
             
             logger.info(f"Successfully created presentacion ID: {new_presentacion.id}")
@@ -785,12 +1635,8 @@ async def update_presentacion(presentacion_id: int, presentacion: PresentacionUp
             
             # Clear related cache entries
             if settings.cache_enabled:
-                await cache_manager.clear_pattern("presentaciones_all*")
-                cache_key = cache_manager._generate_cache_key(
-                    "presentacion_by_id",
-                    presentacion_id=presentacion_id
-                )
-                await cache_manager.delete(cache_key)
+                await cache_manager.invalidate_tag(PRESENTACIONES_TAG)
+                await cache_manager.invalidate_tag(presentacion_tag(presentacion_id))
                 logger.info(f"Cleared cache for presentacion ID: {presentacion_id}")
             
             logger.info(f"Successfully updated presentacion ID: {presentacion_id}")
@@ -828,12 +1674,8 @@ async def delete_presentacion(presentacion_id: int):
             
             # Clear related cache entries
             if settings.cache_enabled:
-                await cache_manager.clear_pattern("presentaciones_all*")
-                cache_key = cache_manager._generate_cache_key(
-                    "presentacion_by_id",
-                    presentacion_id=presentacion_id
-                )
-                await cache_manager.delete(cache_key)
+                await cache_manager.invalidate_tag(PRESENTACIONES_TAG)
+                await cache_manager.invalidate_tag(presentacion_tag(presentacion_id))
                 logger.info(f"Cleared cache for deleted presentacion ID: {presentacion_id}")
             
             logger.info(f"Successfully deleted presentacion ID: {presentacion_id}")
@@ -867,11 +1709,81 @@ async def clear_presentaciones_cache():
 # PHL_PT_ALL_TABLA ENDPOINTS
 # ============================================================================
 
+def build_phl_pt_all_tabla_record(row) -> PhlPtAllTablaResponse:
+    """Convierte una fila de phl_pt_all_tabla al modelo de respuesta"""
+    return PhlPtAllTablaResponse(
+        id=row['id'],
+        envio=row['envio'],
+        semana=float(row['semana']) if row['semana'] is not None else None,
+        fecha_produccion=row['fecha_produccion'],
+        fecha_cosecha=row['fecha_cosecha'],
+        cliente=row['cliente'],
+        tipo_pallet=row['tipo_pallet'],
+        contenedor=row['contenedor'],
+        descripcion_producto=row['descripcion_producto'],
+        destino=row['destino'],
+        fundo=row['fundo'],
+        variedad=row['variedad'],
+        n_cajas=float(row['n_cajas']) if row['n_cajas'] is not None else None,
+        n_pallet=row['n_pallet'],
+        turno=float(row['turno']) if row['turno'] is not None else None,
+        linea=float(row['linea']) if row['linea'] is not None else None,
+        phl_origen=row['phl_origen'],
+        materiales_adicionales=row['materiales_adicionales'],
+        observaciones=row['observaciones'],
+        sobre_peso=row['sobre_peso'],
+        peso_caja=float(row['peso_caja']) if row['peso_caja'] is not None else None,
+        exportable=float(row['exportable']) if row['exportable'] is not None else None,
+        estado=row['estado'],
+        created_at=row['created_at'],
+        updated_at=row['updated_at']
+    )
+
+def parse_date_param(value: str) -> date:
+    """Fecha YYYY-MM-DD de un query param (como el cast ::date, acepta 2024-1-5)"""
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+async def load_phl_pt_all_tabla_pg_json(
+    limit: Optional[int],
+    offset: int,
+    fecha_inicio: Optional[date] = None,
+    fecha_fin: Optional[date] = None
+) -> EncodedBody:
+    """
+    Fast path: Postgres arma el array JSON (json_agg) y el texto se devuelve
+    tal cual, sin decodificar filas ni construir modelos en Python
+    """
+    async with pool.acquire() as connection:
+        if fecha_inicio is not None and fecha_fin is not None:
+            json_text = await query_registry.fetchval(
+                connection, "phl_pt_all_tabla_json_date_range_page",
+                fecha_inicio, fecha_fin, limit, offset
+            )
+        else:
+            json_text = await query_registry.fetchval(
+                connection, "phl_pt_all_tabla_json_page", limit, offset
+            )
+        
+        logger.info(f"Successfully retrieved phl_pt_all_tabla JSON from Postgres ({len(json_text)} chars)")
+        return EncodedBody(json_text.encode())
+
+async def load_phl_pt_all_tabla(limit: Optional[int], offset: int) -> EncodedBody:
+    """Lee de la DB los registros de phl_pt_all_tabla con paginación opcional"""
+    async with pool.acquire() as connection:
+        # LIMIT NULL = sin límite: un solo statement preparado para todas las páginas
+        rows = await query_registry.fetch(connection, "phl_pt_all_tabla_page", limit, offset)
+        records = [build_phl_pt_all_tabla_record(row) for row in rows]
+        
+        logger.info(f"Successfully retrieved {len(records)} phl_pt_all_tabla records")
+        return EncodedBody(PHL_PT_ALL_TABLA_LIST_ADAPTER.dump_json(records))
+
 @app.get("/phl-pt-all-tabla", response_model=List[PhlPtAllTablaResponse])
 async def get_all_phl_pt_all_tabla(
+    http_request: Request,
     use_cache: bool = Query(True, description="Usar cache para la respuesta"),
     limit: Optional[int] = Query(None, description="Límite de resultados", ge=1, le=10000),
-    offset: Optional[int] = Query(0, description="Offset para paginación", ge=0)
+    offset: Optional[int] = Query(0, description="Offset para paginación", ge=0),
+    pg_json: bool = Query(False, description="Armar el JSON en Postgres (exportaciones masivas)")
 ):
     """
     Obtiene todos los registros de phl_pt_all_tabla con paginación opcional y cache
@@ -883,108 +1795,53 @@ async def get_all_phl_pt_all_tabla(
     cache_key = cache_manager._generate_cache_key(
         "phl_pt_all_tabla_all",
         limit=limit,
-        offset=offset
+        offset=offset,
+        pg_json=pg_json
     )
     
     try:
-        # Try to get from cache if enabled
+        if pg_json:
+            loader = partial(load_phl_pt_all_tabla_pg_json, limit, offset)
+        else:
+            loader = partial(load_phl_pt_all_tabla, limit, offset)
+        
         if use_cache and settings.cache_enabled:
-            cached_result = await cache_manager.get(cache_key)
-            if cached_result is not None:
-                logger.info(f"Cache hit for phl_pt_all_tabla list (limit: {limit}, offset: {offset})")
-                return [PhlPtAllTablaResponse(**item) for item in cached_result]
+            body = await cache_manager.get_or_load(cache_key, loader, tags=[PHL_PT_ALL_TABLA_TAG])
+        else:
+            body = await loader()
         
-        async with pool.acquire() as connection:
-            # Build query with optional pagination
-            base_query = """
-            SELECT 
-                id,
-                envio,
-                semana,
-                fecha_produccion,
-                fecha_cosecha,
-                cliente,
-                tipo_pallet,
-                contenedor,
-                descripcion_producto,
-                destino,
-                fundo,
-                variedad,
-                n_cajas,
-                n_pallet,
-                turno,
-                linea,
-                phl_origen,
-                materiales_adicionales,
-                observaciones,
-                sobre_peso,
-                peso_caja,
-                exportable,
-                estado,
-                created_at,
-                updated_at
-            FROM phl_pt_all_tabla
-            ORDER BY fecha_produccion DESC, id DESC
-            """
-            
-            if limit is not None:
-                query = base_query + f" LIMIT {limit} OFFSET {offset}"
-            else:
-                query = base_query
-            
-            rows = await connection.fetch(query)
-            
-            records = [
-                PhlPtAllTablaResponse(
-                    id=row['id'],
-                    envio=row['envio'],
-                    semana=float(row['semana']) if row['semana'] is not None else None,
-                    fecha_produccion=row['fecha_produccion'],
-                    fecha_cosecha=row['fecha_cosecha'],
-                    cliente=row['cliente'],
-                    tipo_pallet=row['tipo_pallet'],
-                    contenedor=row['contenedor'],
-                    descripcion_producto=row['descripcion_producto'],
-                    destino=row['destino'],
-                    fundo=row['fundo'],
-                    variedad=row['variedad'],
-                    n_cajas=float(row['n_cajas']) if row['n_cajas'] is not None else None,
-                    n_pallet=row['n_pallet'],
-                    turno=float(row['turno']) if row['turno'] is not None else None,
-                    linea=float(row['linea']) if row['linea'] is not None else None,
-                    phl_origen=row['phl_origen'],
-                    materiales_adicionales=row['materiales_adicionales'],
-                    observaciones=row['observaciones'],
-                    sobre_peso=row['sobre_peso'],
-                    peso_caja=float(row['peso_caja']) if row['peso_caja'] is not None else None,
-                    exportable=float(row['exportable']) if row['exportable'] is not None else None,
-                    estado=row['estado'],
-                    created_at=row['created_at'],
-                    updated_at=row['updated_at']
-                )
-                for row in rows
-            ]
-            
-            # Save to cache if enabled
-            if use_cache and settings.cache_enabled:
-                cache_data = [record.model_dump() for record in records]
-                await cache_manager.set(cache_key, cache_data)
-                logger.info(f"Cached {len(records)} phl_pt_all_tabla records")
-            
-            logger.info(f"Successfully retrieved {len(records)} phl_pt_all_tabla records")
-            return records
+        return encoded_body_response(body, http_request)
             
     except Exception as e:
         logger.error(f"Error retrieving phl_pt_all_tabla records: {e}")
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
+async def load_phl_pt_all_tabla_by_date_range(
+    fecha_inicio: date,
+    fecha_fin: date,
+    limit: Optional[int],
+    offset: int
+) -> EncodedBody:
+    """Lee de la DB los registros de phl_pt_all_tabla en un rango de fecha_produccion"""
+    async with pool.acquire() as connection:
+        rows = await query_registry.fetch(
+            connection, "phl_pt_all_tabla_date_range_page",
+            fecha_inicio, fecha_fin, limit, offset
+        )
+        records = [build_phl_pt_all_tabla_record(row) for row in rows]
+        
+        logger.info(f"Successfully retrieved {len(records)} phl_pt_all_tabla records for date range {fecha_inicio} to {fecha_fin}")
+        return EncodedBody(PHL_PT_ALL_TABLA_LIST_ADAPTER.dump_json(records))
+
 @app.get("/phl-pt-all-tabla/by-date-range", response_model=List[PhlPtAllTablaResponse])
 async def get_phl_pt_all_tabla_by_date_range(
+    http_request: Request,
     fecha_inicio: str = Query(..., description="Fecha de inicio (YYYY-MM-DD)"),
     fecha_fin: str = Query(..., description="Fecha de fin (YYYY-MM-DD)"),
     use_cache: bool = Query(True, description="Usar cache para la respuesta"),
     limit: Optional[int] = Query(None, description="Límite de resultados", ge=1, le=10000),
-    offset: Optional[int] = Query(0, description="Offset para paginación", ge=0)
+    offset: Optional[int] = Query(0, description="Offset para paginación", ge=0),
+    pg_json: bool = Query(False, description="Armar el JSON en Postgres (exportaciones masivas)")
 ):
     """
     Obtiene registros de phl_pt_all_tabla filtrados por rango de fecha_produccion
@@ -994,14 +1851,25 @@ async def get_phl_pt_all_tabla_by_date_range(
     
     # Validate date format
     try:
-        from datetime import datetime
-        datetime.strptime(fecha_inicio, "%Y-%m-%d")
-        datetime.strptime(fecha_fin, "%Y-%m-%d")
+        fecha_inicio_date = parse_date_param(fecha_inicio)
+        fecha_fin_date = parse_date_param(fecha_fin)
     except ValueError:
         raise HTTPException(
             status_code=400,
             detail="Formato de fecha inválido. Use YYYY-MM-DD"
         )
+    # Forma canónica (2024-1-5 -> 2024-01-05) para la clave de cache y el registro de accesos
+    fecha_inicio = fecha_inicio_date.isoformat()
+    fecha_fin = fecha_fin_date.isoformat()
+    
+    access_tracker.record(
+        "phl_pt_all_tabla_date_range",
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin,
+        limit=limit,
+        offset=offset,
+        pg_json=pg_json
+    )
     
     # Generate cache key
     cache_key = cache_manager._generate_cache_key(
@@ -1009,98 +1877,22 @@ async def get_phl_pt_all_tabla_by_date_range(
         fecha_inicio=fecha_inicio,
         fecha_fin=fecha_fin,
         limit=limit,
-        offset=offset
+        offset=offset,
+        pg_json=pg_json
     )
     
     try:
-        # Try to get from cache if enabled
+        if pg_json:
+            loader = partial(load_phl_pt_all_tabla_pg_json, limit, offset, fecha_inicio_date, fecha_fin_date)
+        else:
+            loader = partial(load_phl_pt_all_tabla_by_date_range, fecha_inicio_date, fecha_fin_date, limit, offset)
+        
         if use_cache and settings.cache_enabled:
-            cached_result = await cache_manager.get(cache_key)
-            if cached_result is not None:
-                logger.info(f"Cache hit for phl_pt_all_tabla date range ({fecha_inicio} to {fecha_fin})")
-                return [PhlPtAllTablaResponse(**item) for item in cached_result]
+            body = await cache_manager.get_or_load(cache_key, loader, tags=[PHL_PT_ALL_TABLA_TAG])
+        else:
+            body = await loader()
         
-        async with pool.acquire() as connection:
-            # Build query with date range filter
-            base_query = """
-            SELECT 
-                id,
-                envio,
-                semana,
-                fecha_produccion,
-                fecha_cosecha,
-                cliente,
-                tipo_pallet,
-                contenedor,
-                descripcion_producto,
-                destino,
-                fundo,
-                variedad,
-                n_cajas,
-                n_pallet,
-                turno,
-                linea,
-                phl_origen,
-                materiales_adicionales,
-                observaciones,
-                sobre_peso,
-                peso_caja,
-                exportable,
-                estado,
-                created_at,
-                updated_at
-            FROM phl_pt_all_tabla
-            WHERE fecha_produccion >= $1::date 
-            AND fecha_produccion <= $2::date
-            ORDER BY fecha_produccion DESC, id DESC
-            """
-            
-            if limit is not None:
-                query = base_query + f" LIMIT {limit} OFFSET {offset}"
-            else:
-                query = base_query
-            
-            rows = await connection.fetch(query, fecha_inicio, fecha_fin)
-            
-            records = [
-                PhlPtAllTablaResponse(
-                    id=row['id'],
-                    envio=row['envio'],
-                    semana=float(row['semana']) if row['semana'] is not None else None,
-                    fecha_produccion=row['fecha_produccion'],
-                    fecha_cosecha=row['fecha_cosecha'],
-                    cliente=row['cliente'],
-                    tipo_pallet=row['tipo_pallet'],
-                    contenedor=row['contenedor'],
-                    descripcion_producto=row['descripcion_producto'],
-                    destino=row['destino'],
-                    fundo=row['fundo'],
-                    variedad=row['variedad'],
-                    n_cajas=float(row['n_cajas']) if row['n_cajas'] is not None else None,
-                    n_pallet=row['n_pallet'],
-                    turno=float(row['turno']) if row['turno'] is not None else None,
-                    linea=float(row['linea']) if row['linea'] is not None else None,
-                    phl_origen=row['phl_origen'],
-                    materiales_adicionales=row['materiales_adicionales'],
-                    observaciones=row['observaciones'],
-                    sobre_peso=row['sobre_peso'],
-                    peso_caja=float(row['peso_caja']) if row['peso_caja'] is not None else None,
-                    exportable=float(row['exportable']) if row['exportable'] is not None else None,
-                    estado=row['estado'],
-                    created_at=row['created_at'],
-                    updated_at=row['updated_at']
-                )
-                for row in rows
-            ]
-            
-            # Save to cache if enabled
-            if use_cache and settings.cache_enabled:
-                cache_data = [record.model_dump() for record in records]
-                await cache_manager.set(cache_key, cache_data)
-                logger.info(f"Cached {len(records)} phl_pt_all_tabla records for date range")
-            
-            logger.info(f"Successfully retrieved {len(records)} phl_pt_all_tabla records for date range {fecha_inicio} to {fecha_fin}")
-            return records
+        return encoded_body_response(body, http_request)
             
     except HTTPException:
         raise
@@ -1115,7 +1907,7 @@ async def clear_phl_pt_all_tabla_cache():
     Limpia todo el cache relacionado con phl_pt_all_tabla
     """
     try:
-        deleted_count = await cache_manager.clear_pattern("phl_pt_all_tabla*")
+        deleted_count = await cache_manager.invalidate_tag(PHL_PT_ALL_TABLA_TAG)
         
         return {
             "message": "Cache de phl_pt_all_tabla limpiado exitosamente",
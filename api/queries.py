@@ -0,0 +1,348 @@
+import logging
+from typing import Any, Dict
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# Registro central de queries calientes
+# ============================================================================
+# Todas están parametrizadas (incluido LIMIT/OFFSET: `LIMIT NULL` equivale a
+# sin límite), así que cada una es un único statement que se prepara una vez
+# por conexión en el `init` del pool.
+
+IMAGE_COLUMNS = """
+    id,
+    folder_id,
+    folder_name,
+    folder_webviewlink,
+    folder_modifiedtime,
+    image_id,
+    image_name,
+    image_webviewlink,
+    image_modifiedtime,
+    image_base64,
+    image_size_mb,
+    created_at
+"""
+
+IMAGE_MANIFEST_COLUMNS = """
+    id,
+    folder_id,
+    folder_name,
+    folder_webviewlink,
+    folder_modifiedtime,
+    image_id,
+    image_name,
+    image_webviewlink,
+    image_modifiedtime,
+    image_size_mb,
+    created_at
+"""
+
+PRESENTACION_COLUMNS = """
+    id,
+    descripcion_producto,
+    peso_caja,
+    sobre_peso,
+    esquinero_adicionales,
+    created_at,
+    updated_at
+"""
+
+PHL_PT_ALL_TABLA_COLUMNS = """
+    id,
+    envio,
+    semana,
+    fecha_produccion,
+    fecha_cosecha,
+    cliente,
+    tipo_pallet,
+    contenedor,
+    descripcion_producto,
+    destino,
+    fundo,
+    variedad,
+    n_cajas,
+    n_pallet,
+    turno,
+    linea,
+    phl_origen,
+    materiales_adicionales,
+    observaciones,
+    sobre_peso,
+    peso_caja,
+    exportable,
+    estado,
+    created_at,
+    updated_at
+"""
+
+# Mismos nombres y casts que PhlPtAllTablaResponse, para armar el JSON en Postgres
+PHL_PT_ALL_TABLA_JSON_COLUMNS = """
+    envio,
+    semana::float8 AS semana,
+    fecha_produccion,
+    fecha_cosecha,
+    cliente,
+    tipo_pallet,
+    contenedor,
+    descripcion_producto,
+    destino,
+    fundo,
+    variedad,
+    n_cajas::float8 AS n_cajas,
+    n_pallet,
+    turno::float8 AS turno,
+    linea::float8 AS linea,
+    phl_origen,
+    materiales_adicionales,
+    observaciones,
+    sobre_peso,
+    peso_caja::float8 AS peso_caja,
+    exportable::float8 AS exportable,
+    estado,
+    id,
+    created_at,
+    updated_at
+"""
+
+QUERIES: Dict[str, str] = {
+    # images_fcl_drive
+    "images_by_folder": f"""
+        SELECT {IMAGE_COLUMNS}
+        FROM images_fcl_drive
+        WHERE folder_name = $1
+        ORDER BY created_at DESC
+    """,
+    "images_manifest_by_folder": f"""
+        SELECT {IMAGE_MANIFEST_COLUMNS}
+        FROM images_fcl_drive
+        WHERE folder_name = $1
+        ORDER BY created_at DESC
+    """,
+    "images_page_first": f"""
+        SELECT {IMAGE_COLUMNS}
+        FROM images_fcl_drive
+        WHERE folder_name = $1
+        ORDER BY created_at DESC, id DESC
+        LIMIT $2
+    """,
+    "images_page_after": f"""
+        SELECT {IMAGE_COLUMNS}
+        FROM images_fcl_drive
+        WHERE folder_name = $1
+        AND (created_at, id) < ($2, $3)
+        ORDER BY created_at DESC, id DESC
+        LIMIT $4
+    """,
+    "images_by_folders": f"""
+        SELECT {IMAGE_COLUMNS}
+        FROM images_fcl_drive
+        WHERE folder_name = ANY($1::text[])
+        ORDER BY folder_name, created_at DESC
+    """,
+    "images_manifest_by_folders": f"""
+        SELECT {IMAGE_MANIFEST_COLUMNS}
+        FROM images_fcl_drive
+        WHERE folder_name = ANY($1::text[])
+        ORDER BY folder_name, created_at DESC
+    """,
+    "image_meta": """
+        SELECT image_name, image_modifiedtime
+        FROM images_fcl_drive
+        WHERE image_id = $1
+        ORDER BY created_at DESC
+        LIMIT 1
+    """,
+    "image_with_base64": """
+        SELECT image_name, image_modifiedtime, image_base64
+        FROM images_fcl_drive
+        WHERE image_id = $1
+        ORDER BY created_at DESC
+        LIMIT 1
+    """,
+    "folders_list": """
+        SELECT DISTINCT folder_name
+        FROM images_fcl_drive
+        WHERE folder_name IS NOT NULL
+        ORDER BY folder_name
+    """,
+    "folders_existing": """
+        SELECT DISTINCT folder_name
+        FROM images_fcl_drive
+        WHERE folder_name = ANY($1::text[])
+    """,
+    "folder_catalog": """
+        SELECT folder_name,
+               COUNT(*) AS image_count,
+               COALESCE(SUM(image_size_mb), 0) AS total_size_mb,
+               MAX(image_modifiedtime) AS last_modified
+        FROM images_fcl_drive
+        WHERE folder_name IS NOT NULL
+        GROUP BY folder_name
+        ORDER BY folder_name
+    """,
+    "folder_catalog_by_folders": """
+        SELECT folder_name,
+               COUNT(*) AS image_count,
+               COALESCE(SUM(image_size_mb), 0) AS total_size_mb,
+               MAX(image_modifiedtime) AS last_modified
+        FROM images_fcl_drive
+        WHERE folder_name = ANY($1::text[])
+        GROUP BY folder_name
+    """,
+    # Marcas de agua por tabla para validar el snapshot del cache al arrancar.
+    # En images_fcl_drive, MAX(image_modifiedtime) detecta UPDATEs (re-ingestas)
+    # que no cambian ni el conteo ni created_at.
+    "table_watermarks": """
+        SELECT 'images_fcl_drive' AS table_name, COUNT(*) AS row_count,
+               MAX(created_at) AS last_change, MAX(image_modifiedtime) AS last_modified
+        FROM images_fcl_drive
+        UNION ALL
+        SELECT 'presentaciones', COUNT(*), MAX(updated_at), NULL FROM presentaciones
+        UNION ALL
+        SELECT 'phl_pt_all_tabla', COUNT(*), MAX(updated_at), NULL FROM phl_pt_all_tabla
+    """,
+    "folder_image_count": """
+        SELECT COUNT(*) as count FROM images_fcl_drive WHERE folder_name = $1
+    """,
+    # presentaciones
+    "presentaciones_page": f"""
+        SELECT {PRESENTACION_COLUMNS}
+        FROM presentaciones
+        ORDER BY created_at DESC
+        LIMIT $1 OFFSET $2
+    """,
+    "presentacion_by_id": f"""
+        SELECT {PRESENTACION_COLUMNS}
+        FROM presentaciones
+        WHERE id = $1
+    """,
+    # phl_pt_all_tabla
+    "phl_pt_all_tabla_page": f"""
+        SELECT {PHL_PT_ALL_TABLA_COLUMNS}
+        FROM phl_pt_all_tabla
+        ORDER BY fecha_produccion DESC, id DESC
+        LIMIT $1 OFFSET $2
+    """,
+    "phl_pt_all_tabla_date_range_page": f"""
+        SELECT {PHL_PT_ALL_TABLA_COLUMNS}
+        FROM phl_pt_all_tabla
+        WHERE fecha_produccion >= $1::date
+        AND fecha_produccion <= $2::date
+        ORDER BY fecha_produccion DESC, id DESC
+        LIMIT $3 OFFSET $4
+    """,
+    "phl_pt_all_tabla_json_page": f"""
+        SELECT COALESCE(
+            json_agg(t ORDER BY t.fecha_produccion DESC, t.id DESC),
+            '[]'::json
+        )::text
+        FROM (
+            SELECT {PHL_PT_ALL_TABLA_JSON_COLUMNS}
+            FROM phl_pt_all_tabla
+            ORDER BY fecha_produccion DESC, id DESC
+            LIMIT $1 OFFSET $2
+        ) t
+    """,
+    "phl_pt_all_tabla_json_date_range_page": f"""
+        SELECT COALESCE(
+            json_agg(t ORDER BY t.fecha_produccion DESC, t.id DESC),
+            '[]'::json
+        )::text
+        FROM (
+            SELECT {PHL_PT_ALL_TABLA_JSON_COLUMNS}
+            FROM phl_pt_all_tabla
+            WHERE fecha_produccion >= $1::date
+            AND fecha_produccion <= $2::date
+            ORDER BY fecha_produccion DESC, id DESC
+            LIMIT $3 OFFSET $4
+        ) t
+    """,
+}
+
+class RegistryConnection(asyncpg.Connection):
+    """Conexión del pool que guarda los statements del registro ya preparados"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements: Dict[str, Any] = {}
+
+class QueryRegistry:
+    """
+    Prepara las queries registradas en cada conexión del pool y las ejecuta
+    por nombre, con métricas de hits/misses de statements preparados
+    """
+
+    # Errores tras los que el statement se vuelve a preparar (p. ej. cambios de esquema)
+    REPREPARE_ERRORS = (
+        asyncpg.exceptions.InvalidCachedStatementError,
+        asyncpg.exceptions.OutdatedSchemaCacheError,
+    )
+
+    def __init__(self, queries: Dict[str, str]):
+        self.queries = queries
+        self.hits = 0
+        self.misses = 0
+        self.reprepares = 0
+        self.prepare_errors = 0
+        self.prepared_connections = 0
+
+    def get_query(self, name: str) -> str:
+        return self.queries[name]
+
+    async def init_connection(self, connection):
+        """Hook `init` de asyncpg.create_pool: preparar todas las queries"""
+        prepared = getattr(connection, "prepared_statements", None)
+        if prepared is None:
+            return
+        for name, query in self.queries.items():
+            try:
+                prepared[name] = await connection.prepare(query)
+            except Exception as e:
+                # Sin preparar, la query se ejecuta como texto (miss)
+                self.prepare_errors += 1
+                logger.warning(f"Could not prepare query {name}: {e}")
+        self.prepared_connections += 1
+
+    async def fetch(self, connection, name: str, *args) -> list:
+        return await self._run(connection, name, "fetch", args)
+
+    async def fetchrow(self, connection, name: str, *args):
+        return await self._run(connection, name, "fetchrow", args)
+
+    async def fetchval(self, connection, name: str, *args):
+        return await self._run(connection, name, "fetchval", args)
+
+    async def _run(self, connection, name: str, method: str, args: tuple):
+        prepared = getattr(connection, "prepared_statements", None)
+        statement = prepared.get(name) if prepared else None
+
+        if statement is None:
+            self.misses += 1
+            return await getattr(connection, method)(self.queries[name], *args)
+
+        self.hits += 1
+        try:
+            return await getattr(statement, method)(*args)
+        except self.REPREPARE_ERRORS:
+            self.reprepares += 1
+            statement = await connection.prepare(self.queries[name])
+            prepared[name] = statement
+            return await getattr(statement, method)(*args)
+
+    def get_stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "registered_queries": len(self.queries),
+            "prepared_connections": self.prepared_connections,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+            "reprepares": self.reprepares,
+            "prepare_errors": self.prepare_errors
+        }
+
+# Instancia global del registro de queries
+query_registry = QueryRegistry(QUERIES)
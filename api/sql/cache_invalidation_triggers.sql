@@ -0,0 +1,54 @@
+-- Triggers de invalidación de cache para la Images API
+--
+-- Emiten NOTIFY en el canal `cache_invalidation` (Settings.db_notify_channel)
+-- con un payload JSON {"table", "op", "key", ...} por cada fila modificada.
+-- Postgres descarta notificaciones idénticas dentro de la misma transacción,
+-- así que una carga masiva de un folder produce una sola notificación.
+--
+-- phl_pt_all_tabla se invalida completa ante cualquier cambio, así que su
+-- trigger es por sentencia y sin `key`: una carga masiva emite una sola
+-- notificación por sentencia en lugar de una por fila.
+--
+-- Aplicar una vez por base de datos:
+--   psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -f sql/cache_invalidation_triggers.sql
+
+CREATE OR REPLACE FUNCTION notify_cache_invalidation() RETURNS trigger AS $$
+DECLARE
+    payload json;
+BEGIN
+    IF TG_LEVEL = 'STATEMENT' THEN
+        payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP);
+    ELSIF TG_TABLE_NAME = 'images_fcl_drive' THEN
+        IF TG_OP = 'DELETE' THEN
+            payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'key', OLD.folder_name);
+        ELSIF TG_OP = 'UPDATE' AND OLD.folder_name IS DISTINCT FROM NEW.folder_name THEN
+            payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'key', NEW.folder_name,
+                                         'old_key', OLD.folder_name);
+        ELSE
+            payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'key', NEW.folder_name);
+        END IF;
+    ELSIF TG_OP = 'DELETE' THEN
+        payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'key', OLD.id);
+    ELSE
+        payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'key', NEW.id);
+    END IF;
+
+    PERFORM pg_notify('cache_invalidation', payload::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS images_fcl_drive_cache_invalidation ON images_fcl_drive;
+CREATE TRIGGER images_fcl_drive_cache_invalidation
+    AFTER INSERT OR UPDATE OR DELETE ON images_fcl_drive
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS phl_pt_all_tabla_cache_invalidation ON phl_pt_all_tabla;
+CREATE TRIGGER phl_pt_all_tabla_cache_invalidation
+    AFTER INSERT OR UPDATE OR DELETE ON phl_pt_all_tabla
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS presentaciones_cache_invalidation ON presentaciones;
+CREATE TRIGGER presentaciones_cache_invalidation
+    AFTER INSERT OR UPDATE OR DELETE ON presentaciones
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation();
@@ -0,0 +1,16 @@
+-- Índice de la paginación por keyset de la Images API
+--
+-- POST /images/by-folder/page filtra por folder_name y pagina con
+-- (created_at, id) < ($2, $3) ORDER BY created_at DESC, id DESC
+-- (queries images_page_first / images_page_after). Con este índice cada
+-- página es un único range scan que se detiene en LIMIT filas; sin él,
+-- Postgres vuelve a ordenar todo el folder en cada página.
+--
+-- CONCURRENTLY no bloquea las escrituras mientras se construye, pero no
+-- puede correr dentro de una transacción (no usar psql -1).
+--
+-- Aplicar una vez por base de datos:
+--   psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -f sql/images_folder_pagination_index.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS images_fcl_drive_folder_created_id_idx
+    ON images_fcl_drive (folder_name, created_at DESC, id DESC);
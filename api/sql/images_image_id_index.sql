@@ -0,0 +1,17 @@
+-- Índice de la lectura por image_id de la Images API
+--
+-- GET /images/{image_id}/raw y /images/{image_id}/thumb buscan la fila más
+-- reciente de un image_id con WHERE image_id = $1 ORDER BY created_at DESC
+-- LIMIT 1 (queries image_meta / image_with_base64). Cada request, también
+-- los hits de cache, corre image_meta para validar el ETag; con este índice
+-- es un único index scan que se detiene en la primera fila, sin él Postgres
+-- recorre la tabla entera.
+--
+-- CONCURRENTLY no bloquea las escrituras mientras se construye, pero no
+-- puede correr dentro de una transacción (no usar psql -1).
+--
+-- Aplicar una vez por base de datos:
+--   psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -f sql/images_image_id_index.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS images_fcl_drive_image_id_created_idx
+    ON images_fcl_drive (image_id, created_at DESC);
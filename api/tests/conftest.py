@@ -0,0 +1,16 @@
+"""Configuración común de los tests: las corrutinas corren con anyio sobre asyncio"""
+import inspect
+
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pycollect_makeitem(collector, name, obj):
+    # Antes que el plugin de anyio, que solo recoge las corrutinas ya marcadas
+    if collector.istestfunction(obj, name) and inspect.iscoroutinefunction(obj):
+        pytest.mark.anyio(obj)
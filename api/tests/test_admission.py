@@ -0,0 +1,70 @@
+"""Filtro de admisión TinyLFU de ByteBudgetTLRUCache"""
+import pytest
+
+from cache_manager import ByteBudgetTLRUCache, CacheEntry, FrequencySketch
+
+
+def make_cache(entries: int) -> tuple:
+    entry_size = CacheEntry("x" * 1000, ttl=60, soft_ttl=60).size
+    cache = ByteBudgetTLRUCache(maxsize=entry_size * entries, sketch=FrequencySketch(1024))
+    return cache, entry_size
+
+
+def put(cache: ByteBudgetTLRUCache, key: str, ttl: float, hits: int = 0):
+    for _ in range(hits):
+        cache.sketch.increment(key)
+    entry = CacheEntry("x" * 1000, ttl=ttl, soft_ttl=ttl)
+    assert cache.admit(key, entry.size)
+    cache[key] = entry
+
+
+def test_victims_follow_lru_order_not_expiry_heap():
+    cache, size = make_cache(3)
+    # Orden del heap por vencimiento: hot-a (10s), hot-c (100s), cold-b (1000s)
+    put(cache, "hot-a", ttl=10, hits=5)
+    put(cache, "cold-b", ttl=1000)
+    put(cache, "hot-c", ttl=100, hits=5)
+    # Orden LRU: cold-b, hot-c, hot-a
+    cache["hot-a"]
+    assert list(cache.lru_keys()) == ["cold-b", "hot-c", "hot-a"]
+
+    cache.sketch.increment("new")
+    assert cache.admit("new", size)
+    assert "cold-b" not in cache
+    assert "hot-a" in cache and "hot-c" in cache
+    assert cache.rejected == 0
+
+
+def test_candidate_colder_than_lru_victim_is_rejected():
+    cache, size = make_cache(2)
+    put(cache, "a", ttl=60, hits=3)
+    put(cache, "b", ttl=60, hits=3)
+
+    assert not cache.admit("new", size)
+    assert cache.rejected == 1
+    assert "a" in cache and "b" in cache
+
+
+def test_value_larger_than_partition_evicts_nothing():
+    cache, size = make_cache(2)
+    put(cache, "a", ttl=60)
+    put(cache, "b", ttl=60)
+    for _ in range(10):
+        cache.sketch.increment("huge")
+
+    with pytest.raises(ValueError):
+        cache.admit("huge", size * 3)
+    assert "a" in cache and "b" in cache
+    assert cache.evictions == 0
+
+
+def test_largest_entries_keeps_lru_order():
+    cache, _ = make_cache(3)
+    put(cache, "a", ttl=60)
+    put(cache, "b", ttl=60)
+    put(cache, "c", ttl=60)
+    cache["a"]
+    order = list(cache.lru_keys())
+
+    assert len(cache.largest_entries()) == 3
+    assert list(cache.lru_keys()) == order
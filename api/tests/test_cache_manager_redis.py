@@ -0,0 +1,265 @@
+"""
+Cache de dos niveles contra un Redis falso (fakeredis): read-through del L2,
+propagación de invalidaciones entre workers y reconexión del listener.
+"""
+import asyncio
+import pickle
+from datetime import datetime
+from decimal import Decimal
+
+import fakeredis
+import pytest
+
+import cache_manager
+from cache_manager import CacheManager, EncodedBody, NegativeResult
+from config import settings
+
+
+@pytest.fixture
+async def cluster():
+    """Dos workers con L1 propio que comparten el mismo Redis"""
+    server = fakeredis.FakeServer()
+    workers = [CacheManager(fakeredis.aioredis.FakeRedis(server=server)) for _ in range(2)]
+    for worker in workers:
+        await worker.initialize()
+    yield server, *workers
+    for worker in workers:
+        await worker.close()
+
+
+async def wait_for(condition, timeout: float = 3.0):
+    """Esperar a que el listener de pub/sub aplique una invalidación"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not met before timeout")
+        await asyncio.sleep(0.01)
+
+
+async def test_read_through_fills_l1_with_remaining_ttl(cluster):
+    _, a, b = cluster
+    await a.set("presentacion_by_id:1", {"id": 1}, ttl=60)
+
+    assert await b.get("presentacion_by_id:1") == {"id": 1}
+    assert b.l2_hits == 1
+    assert b.memory_cache.peek("presentacion_by_id:1").ttl <= 60
+
+    # El segundo acceso ya es un hit del L1
+    assert await b.get("presentacion_by_id:1") == {"id": 1}
+    assert b.l2_hits == 1
+
+
+async def test_l2_round_trips_cached_types(cluster):
+    _, a, b = cluster
+    value = {"created_at": datetime(2024, 1, 2, 3, 4, 5), "peso": Decimal("1.50"), "items": [1, None]}
+    body = EncodedBody(b'{"a":1}' * 500)
+    await a.set("presentaciones_all:1", value)
+    await a.set("images_by_folder:1", body)
+    await a.set_negative("images_by_folder:2", "no encontrado")
+
+    assert await b.get("presentaciones_all:1") == value
+    cached_body = await b.get("images_by_folder:1")
+    assert cached_body.content == body.content
+    assert cached_body.gzip_content == body.gzip_content
+    negative = (await b.get_many(["images_by_folder:2"]))["images_by_folder:2"]
+    assert isinstance(negative, NegativeResult)
+    assert negative.detail == "no encontrado"
+
+
+async def test_l2_never_unpickles(cluster):
+    _, a, b = cluster
+
+    class Exploit:
+        def __reduce__(self):
+            return (exec, ("raise SystemExit('executed')",))
+
+    await b.redis.set(b._redis_key("presentacion_by_id:9"), pickle.dumps(Exploit()))
+    assert await b.get("presentacion_by_id:9") is None
+    assert await b.get_many(["presentacion_by_id:9"]) == {}
+
+
+async def test_read_through_registers_tags(cluster):
+    _, a, b = cluster
+    await a.set("images_by_folder:1", "x", tags=["folder:A"])
+    await a.set("images_by_folder:2", "y", tags=["folder:B"])
+
+    assert await b.get("images_by_folder:1") == "x"
+    assert await b.get_many(["images_by_folder:2"]) == {"images_by_folder:2": "y"}
+    # Un snapshot de B lleva los tags y se valida por folder al recargarlo
+    assert b.local_tags("folder:") == ["folder:A", "folder:B"]
+    assert dict((key, tags) for key, _, _, _, _, tags, _ in b._snapshot_records()) == {
+        "images_by_folder:1": ("folder:A",),
+        "images_by_folder:2": ("folder:B",),
+    }
+
+
+async def test_l2_entries_without_tags_are_misses(cluster):
+    _, a, b = cluster
+    # Formato anterior: solo el valor, sin tags
+    await b.redis.set(b._redis_key("images_by_folder:1"), b"\xa1x")
+    assert await b.get("images_by_folder:1") is None
+    assert "images_by_folder:1" not in b.memory_cache
+
+
+async def test_delete_propagates_to_other_workers(cluster):
+    _, a, b = cluster
+    await a.set("presentacion_by_id:1", {"id": 1})
+    await b.get("presentacion_by_id:1")
+    assert "presentacion_by_id:1" in b.memory_cache
+
+    await a.delete("presentacion_by_id:1")
+
+    await wait_for(lambda: "presentacion_by_id:1" not in b.memory_cache)
+    assert await b.get("presentacion_by_id:1") is None
+
+
+async def test_tag_invalidation_propagates_to_other_workers(cluster):
+    _, a, b = cluster
+    await a.set("images_by_folder:1", "x", tags=["folder:A"])
+    await a.set("images_by_folder:2", "y", tags=["folder:B"])
+    await b.get("images_by_folder:1")
+    await b.get("images_by_folder:2")
+
+    assert await a.invalidate_tag("folder:A") == 1
+
+    await wait_for(lambda: "images_by_folder:1" not in b.memory_cache)
+    assert "images_by_folder:2" in b.memory_cache
+    assert await b.get("images_by_folder:1") is None
+
+
+async def test_pattern_clear_propagates_to_other_workers(cluster):
+    _, a, b = cluster
+    await a.set("presentaciones_all:1", [1])
+    await a.set("presentacion_by_id:1", {"id": 1})
+    await b.get("presentaciones_all:1")
+    await b.get("presentacion_by_id:1")
+
+    await a.clear_pattern("presentaciones_all*")
+
+    await wait_for(lambda: "presentaciones_all:1" not in b.memory_cache)
+    assert "presentacion_by_id:1" in b.memory_cache
+
+
+async def test_listener_reconnects_and_clears_l1(cluster):
+    server, a, b = cluster
+    await a.set("presentacion_by_id:1", {"id": 1})
+    await b.get("presentacion_by_id:1")
+
+    # Corte de conexión: el listener no debe terminar. fakeredis no despierta una
+    # lectura ya bloqueada; un mensaje la despierta y la siguiente lectura ve el corte.
+    server.connected = False
+    b._pubsub.connection._sock.put_response([b"message", b"other", b"{}"])
+    await wait_for(lambda: b._pubsub is None)
+    assert not b._invalidation_task.done()
+    server.connected = True
+
+    # Al volver a suscribirse descarta el L1, que pudo perder invalidaciones
+    await wait_for(lambda: b.invalidation_reconnects == 1)
+    assert "presentacion_by_id:1" not in b.memory_cache
+
+    # Y sigue recibiendo las invalidaciones nuevas
+    await b.get("presentacion_by_id:1")
+    await a.delete("presentacion_by_id:1")
+    await wait_for(lambda: "presentacion_by_id:1" not in b.memory_cache)
+
+
+async def test_l2_outage_opens_circuit_and_recovers(cluster, monkeypatch):
+    server, a, _ = cluster
+    monkeypatch.setattr(settings, "redis_retry_seconds", 0.05)
+    await a.set("presentacion_by_id:1", {"id": 1})
+    a.memory_cache.clear()
+
+    server.connected = False
+    assert await a.get("presentacion_by_id:1") is None
+    # Error del L2 contado también como miss
+    assert a.l2_errors == 1
+    assert a.misses == 1
+    assert a.prefix_stats["presentacion_by_id"] == [0, 1]
+
+    # Con el circuito abierto no se vuelve a intentar Redis
+    assert await a.get("presentacion_by_id:1") is None
+    assert await a.set("presentacion_by_id:2", {"id": 2})
+    assert await a.get("presentacion_by_id:2") == {"id": 2}
+    assert a.l2_errors == 1
+    assert (await a.get_stats())["cache_type"] == "memory_only"
+
+    server.connected = True
+    await asyncio.sleep(0.06)
+    assert await a.get("presentacion_by_id:1") == {"id": 1}
+    assert a._l2_ready()
+
+
+async def test_untracked_reads_skip_hit_counters(cluster):
+    _, a, _ = cluster
+
+    async def loader():
+        return {"id": 1}
+
+    await a.get_or_load("presentacion_by_id:1", loader, track=False)
+    await a.get_or_load("presentacion_by_id:1", loader, track=False)
+
+    assert a.hits == a.misses == 0
+    assert "presentacion_by_id" not in a.prefix_stats
+    sketch = a.memory_cache.partition("presentacion_by_id:1").sketch
+    assert sketch is None or sketch.estimate("presentacion_by_id:1") == 0
+
+
+async def test_read_through_keeps_loader_for_refresh(cluster):
+    _, a, b = cluster
+
+    async def loader():
+        return {"id": 1}
+
+    await a.get_or_load("presentacion_by_id:1", loader)
+    await a.set("presentacion_by_id:2", {"id": 2})
+
+    assert await b.get_or_load("presentacion_by_id:1", loader) == {"id": 1}
+    assert b.memory_cache.peek("presentacion_by_id:1").loader is loader
+    await b.get_many(["presentacion_by_id:2"], loaders={"presentacion_by_id:2": loader})
+    assert b.memory_cache.peek("presentacion_by_id:2").loader is loader
+
+
+async def test_commands_time_out_but_listener_blocks(monkeypatch):
+    server = fakeredis.FakeServer()
+    clients = []
+
+    def from_url(url, **kwargs):
+        clients.append(kwargs)
+        return fakeredis.aioredis.FakeRedis(server=server)
+
+    monkeypatch.setattr(cache_manager.aioredis, "from_url", from_url)
+    cache = CacheManager()
+    await cache.initialize()
+    await cache.close()
+
+    command_client, pubsub_client = clients
+    assert command_client["socket_timeout"] == settings.redis_socket_timeout
+    assert "socket_timeout" not in pubsub_client
+
+
+async def test_set_many_writes_l2_in_one_pipeline(cluster, monkeypatch):
+    _, a, b = cluster
+    executes = []
+    pipeline = a.redis.pipeline
+
+    def counting_pipeline(*args, **kwargs):
+        executes.append(1)
+        return pipeline(*args, **kwargs)
+
+    monkeypatch.setattr(a.redis, "pipeline", counting_pipeline)
+
+    async def loader():
+        return "x"
+
+    stored = await a.set_many(
+        {"images_by_folder:1": "x", "images_by_folder:2": NegativeResult("no encontrado")},
+        loaders={"images_by_folder:1": loader},
+        tags={"images_by_folder:1": ["folder:A"], "images_by_folder:2": ["folder:B"]}
+    )
+
+    assert stored == 2
+    assert len(executes) == 1
+    assert a.memory_cache.peek("images_by_folder:1").loader is loader
+    assert await b.get("images_by_folder:1") == "x"
+    assert isinstance((await b.get_many(["images_by_folder:2"]))["images_by_folder:2"], NegativeResult)
+    assert await a.invalidate_tag("folder:B") == 1
@@ -0,0 +1,71 @@
+"""Snapshot del L1 en disco y recarga en un arranque en caliente"""
+import asyncio
+import os
+
+from cache_manager import SNAPSHOT_MAGIC, CacheManager, EncodedBody, NegativeResult
+
+
+async def test_records_with_shared_objects_reload_intact(tmp_path):
+    path = str(tmp_path / "cache_snapshot.bin")
+    # Los mismos objetos en varios registros: el memo de pickle los referenciaría
+    shared_name = "s1" * 3
+    shared_row = {"folder_name": shared_name, "count": 3, "tags": ("t", 1)}
+    values = {
+        "images_by_folder:1": [shared_name, "count", ("t", 1), shared_row],
+        "images_by_folder:2": [shared_row, shared_name, {}],
+        "presentaciones_all:1": {"rows": [shared_row, shared_row], "name": shared_name},
+        "images_by_folder:3": NegativeResult(shared_name),
+    }
+    source = CacheManager()
+    for key, value in values.items():
+        await source.set(key, value, ttl=60, tags=["folder:A", "folder:B"])
+    assert await source.save_snapshot(path, {"folders": {"A": 1}}) == len(values)
+
+    restored = CacheManager()
+    assert restored.load_snapshot(path) == {"folders": {"A": 1}}
+    assert restored.snapshot_loaded == len(values)
+    for key, value in values.items():
+        cached = await restored._get(key)
+        if isinstance(value, NegativeResult):
+            assert cached.detail == value.detail
+        else:
+            assert cached == value
+    assert set(restored._tag_index["folder:B"]) == set(values)
+
+
+async def test_encoded_bodies_and_ttls_survive_reload(tmp_path):
+    path = str(tmp_path / "cache_snapshot.bin")
+    body = EncodedBody(b'{"a":1}' * 2000)
+    source = CacheManager()
+    await source.set("images_by_folder:1", body, ttl=60)
+    await source.set("images_by_folder:2", body, ttl=60)
+    await source.save_snapshot(path)
+
+    restored = CacheManager()
+    restored.load_snapshot(path)
+    for key in ("images_by_folder:1", "images_by_folder:2"):
+        assert (await restored._get(key)).content == body.content
+        assert restored.memory_cache.peek(key).ttl == 60
+
+
+async def test_unknown_format_is_ignored(tmp_path):
+    path = tmp_path / "cache_snapshot.bin"
+    path.write_bytes(SNAPSHOT_MAGIC.replace(b"SNAPSHOT", b"OTHER") + b"data")
+
+    restored = CacheManager()
+    assert restored.load_snapshot(str(path)) is None
+    assert len(restored.memory_cache) == 0
+
+
+async def test_concurrent_saves_leave_one_complete_snapshot(tmp_path):
+    path = str(tmp_path / "cache_snapshot.bin")
+    workers = [CacheManager() for _ in range(4)]
+    for index, worker in enumerate(workers):
+        await worker.set("presentaciones_all:1", {"worker": index, "rows": list(range(5000))}, ttl=60)
+
+    await asyncio.gather(*(worker.save_snapshot(path) for worker in workers))
+
+    assert os.listdir(tmp_path) == ["cache_snapshot.bin"]
+    restored = CacheManager()
+    restored.load_snapshot(path)
+    assert (await restored.get("presentaciones_all:1"))["rows"] == list(range(5000))
@@ -0,0 +1,34 @@
+"""Intervalo del warm-up programado frente a los TTL de lo que recarga"""
+import time
+
+from cache_manager import CacheManager
+from main import WARMUP_PREFIXES, warmup_interval_seconds
+
+
+def test_interval_fits_the_shortest_stale_window():
+    cache = CacheManager()
+    windows = [cache.stale_window(prefix) for prefix in WARMUP_PREFIXES]
+
+    # phl_pt_all_tabla (120s de TTL) marca el intervalo, no los 240s configurados
+    assert cache.stale_window("phl_pt_all_tabla_date_range") == min(windows)
+    assert warmup_interval_seconds() == min(windows) < 120
+
+
+async def test_untracked_hit_in_stale_window_refreshes_entry():
+    cache = CacheManager()
+    calls = []
+
+    async def loader():
+        calls.append(len(calls))
+        return len(calls)
+
+    key = "phl_pt_all_tabla_date_range:1"
+    assert await cache.get_or_load(key, loader, track=False) == 1
+    entry = cache.memory_cache.peek(key)
+    # Un tick después del soft TTL, todavía antes del hard TTL
+    entry.fresh_until = time.monotonic() - 1
+
+    assert await cache.get_or_load(key, loader, track=False) == 1
+    await cache._inflight[key]
+    assert await cache.get(key) == 2
+    assert cache.memory_cache.peek(key).expires_at > entry.expires_at
@@ -0,0 +1,56 @@
+"""Compresión transparente de valores grandes en el L1"""
+import json
+import os
+
+import pytest
+
+from cache_manager import CacheManager, CompressedValue, EncodedBody, compression_stats
+
+
+def make_body() -> EncodedBody:
+    rows = [{"id": i, "folder_name": f"folder-{i % 7}", "image_base64": "QUJD" * 50} for i in range(500)]
+    return EncodedBody(json.dumps(rows).encode())
+
+
+async def test_compact_body_reports_gzip_cpu_time():
+    body = make_body()
+    # El gzip solo se genera al cachear el cuerpo, fuera del event loop
+    assert body.gzip_content is None
+    before = compression_stats.compress_seconds
+
+    cache = CacheManager()
+    await cache.set("presentaciones_all:1", body)
+
+    assert body.gzip_seconds > 0
+    assert cache.memory_cache.peek("presentaciones_all:1").value.is_compact
+    assert compression_stats.compress_seconds - before == pytest.approx(body.gzip_seconds)
+    assert (await cache.get("presentaciones_all:1")).content == body.content
+
+
+async def test_image_bodies_keep_their_json():
+    cache = CacheManager()
+    await cache.set("images_by_folder:1", make_body())
+
+    assert not cache.memory_cache.peek("images_by_folder:1").value.is_compact
+
+
+async def test_incompressible_body_is_not_compacted():
+    body = EncodedBody(os.urandom(64 * 1024))
+    skipped = compression_stats.skipped_values
+
+    cache = CacheManager()
+    await cache.set("presentaciones_all:1", body)
+
+    assert body.gzip_content is not None
+    assert not cache.memory_cache.peek("presentaciones_all:1").value.is_compact
+    assert compression_stats.skipped_values == skipped + 1
+
+
+async def test_large_values_round_trip_compressed():
+    value = {"rows": [{"id": i, "name": "presentacion" * 10} for i in range(500)]}
+
+    cache = CacheManager()
+    await cache.set("presentaciones_all:1", value)
+
+    assert isinstance(cache.memory_cache.peek("presentaciones_all:1").value, CompressedValue)
+    assert await cache.get("presentaciones_all:1") == value
@@ -0,0 +1,99 @@
+"""Lotes de cambios de DbChangeListener (sin conexión real a Postgres)"""
+import asyncio
+import json
+
+import pytest
+
+from config import settings
+from db_notifications import DbChangeListener
+
+
+@pytest.fixture(autouse=True)
+def short_debounce(monkeypatch):
+    monkeypatch.setattr(settings, "db_notify_debounce_seconds", 0.01)
+
+
+def notify(listener: DbChangeListener, change: dict):
+    listener._on_notification(None, 0, settings.db_notify_channel, json.dumps(change))
+
+
+async def test_duplicate_notifications_are_batched():
+    batches = []
+
+    async def on_changes(changes):
+        batches.append(changes)
+
+    listener = DbChangeListener(on_changes)
+    for _ in range(3):
+        notify(listener, {"table": "presentaciones", "op": "UPDATE", "key": 1})
+    await listener._flush_task
+
+    assert batches == [[{"table": "presentaciones", "op": "UPDATE", "key": 1}]]
+
+
+async def test_change_during_apply_is_not_stranded():
+    batches = []
+    applying = asyncio.Event()
+    release = asyncio.Event()
+
+    async def on_changes(changes):
+        batches.append(changes)
+        applying.set()
+        # Simula el refresco del catálogo/índice contra la DB
+        await release.wait()
+
+    listener = DbChangeListener(on_changes)
+    notify(listener, {"table": "images_fcl_drive", "op": "INSERT", "key": "A"})
+    await applying.wait()
+    notify(listener, {"table": "images_fcl_drive", "op": "INSERT", "key": "B"})
+    release.set()
+    await asyncio.wait_for(listener._flush_task, timeout=1)
+
+    assert [change["key"] for batch in batches for change in batch] == ["A", "B"]
+    assert listener.batches_applied == 2
+
+
+class SilentConnection:
+    """Conexión cuyo TCP murió sin evento de cierre: las consultas no vuelven"""
+
+    def __init__(self):
+        self.terminated = False
+
+    def is_closed(self):
+        return self.terminated
+
+    async def fetchval(self, query):
+        await asyncio.Event().wait()
+
+    def terminate(self):
+        self.terminated = True
+
+    async def close(self):
+        self.terminated = True
+
+
+async def test_dead_connection_is_detected_and_replaced(monkeypatch):
+    monkeypatch.setattr(settings, "db_notify_healthcheck_seconds", 0.01)
+    monkeypatch.setattr(settings, "db_notify_healthcheck_timeout", 0.01)
+    connections = []
+
+    async def connect():
+        connections.append(SilentConnection())
+        listener.connection = connections[-1]
+
+    reconnected = asyncio.Event()
+
+    async def on_reconnect():
+        reconnected.set()
+
+    listener = DbChangeListener(lambda changes: None, on_reconnect=on_reconnect)
+    monkeypatch.setattr(listener, "_connect", connect)
+    await listener.start()
+    assert listener.listening
+
+    # Al fallar el sondeo se descarta la conexión y se reconecta (tras 1s de backoff)
+    await asyncio.wait_for(reconnected.wait(), timeout=3)
+    assert connections[0].terminated
+    assert listener.healthcheck_failures >= 1
+    assert listener.connection is connections[1]
+    await listener.close()
@@ -0,0 +1,61 @@
+"""Carga única por clave (get_or_load) frente a invalidaciones concurrentes"""
+import asyncio
+
+import pytest
+
+from cache_manager import CacheManager
+
+
+class SlowLoader:
+    """Loader que lee la fila y espera a que el test lo suelte"""
+
+    def __init__(self, value):
+        self.value = value
+        self.reading = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        value = self.value
+        self.reading.set()
+        await self.release.wait()
+        return value
+
+
+@pytest.mark.parametrize("invalidate", [
+    lambda cache: cache.invalidate_tag("presentacion:1"),
+    lambda cache: cache.delete("presentacion_by_id:1"),
+    lambda cache: cache.clear_pattern("presentacion_by_id*"),
+])
+async def test_invalidation_during_load_is_not_lost(invalidate):
+    cache = CacheManager()
+    loader = SlowLoader("old")
+    load = asyncio.create_task(cache.get_or_load("presentacion_by_id:1", loader, tags=["presentacion:1"]))
+    await loader.reading.wait()
+
+    # La escritura confirma e invalida mientras el loader tiene la fila vieja
+    await invalidate(cache)
+    loader.release.set()
+
+    assert await load == "old"
+    assert "presentacion_by_id:1" not in cache.memory_cache
+    assert cache.discarded_loads == 1
+
+    # La siguiente carga ya no está marcada y se cachea normalmente
+    async def load_new():
+        return "new"
+
+    assert await cache.get_or_load("presentacion_by_id:1", load_new, tags=["presentacion:1"]) == "new"
+    assert await cache.get("presentacion_by_id:1") == "new"
+
+
+async def test_unrelated_invalidation_keeps_load():
+    cache = CacheManager()
+    loader = SlowLoader("value")
+    load = asyncio.create_task(cache.get_or_load("presentacion_by_id:1", loader, tags=["presentacion:1"]))
+    await loader.reading.wait()
+
+    await cache.invalidate_tag("presentacion:2")
+    loader.release.set()
+
+    assert await load == "value"
+    assert await cache.get("presentacion_by_id:1") == "value"